@@ -0,0 +1,125 @@
+# Wall time and peak memory of MetaData._count_actions against the merge
+# chain it replaced, on a synthetic dump (10M post votes at --scale 1).
+#
+#   python bench/bench_count_actions.py [--scale 1.0] [--repeat 3]
+#
+# Every variant runs in its own process so ru_maxrss is its own peak.
+# The table is printed and appended to bench_output.txt in the repo root.
+import os
+import sys
+import time
+import argparse
+import resource
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "product"))
+sys.path.insert(0, ROOT)
+
+VARIANTS = ["merge", "count_actions"]
+
+
+def synthetic_dump(scale, seed=1):
+    rng = np.random.default_rng(seed)
+    n_posts, n_votes = int(1e6 * scale), int(1e7 * scale)
+    n_comments, n_comment_votes, n_users = int(2e6 * scale), int(2e6 * scale), int(2e5 * scale)
+    types = rng.choice([1, 2], n_posts, p=[.3, .7])
+    posts = pd.DataFrame({
+        "Id": np.arange(1, n_posts + 1),
+        "PostTypeId": types,
+        "ParentId": np.where(types == 2, rng.integers(1, max(2, n_posts // 3), n_posts), np.nan),
+        "OwnerUserId": rng.integers(1, n_users, n_posts),
+        "Score": rng.integers(-5, 50, n_posts),
+        "ViewCount": rng.integers(0, 1000, n_posts)
+    })
+    post_votes = pd.DataFrame({
+        "Id": np.arange(n_votes),
+        "PostId": rng.integers(1, n_posts + 1, n_votes),
+        "UserId": rng.integers(1, n_users, n_votes),
+        "VoteTypeId": rng.choice([2, 3], n_votes)
+    })
+    comments = pd.DataFrame({
+        "Id": np.arange(n_comments),
+        "PostId": rng.integers(1, n_posts + 1, n_comments),
+        "UserId": rng.integers(1, n_users, n_comments)
+    })
+    comment_votes = pd.DataFrame({
+        "Id": np.arange(n_comment_votes),
+        "PostCommentId": rng.integers(0, n_comments, n_comment_votes),
+        "UserId": rng.integers(1, n_users, n_comment_votes)
+    })
+    return posts, post_votes, comments, comment_votes
+
+
+def merge_count_actions(posts, post_votes, comments, comment_votes):
+    # The counters as _new_fields computed them before _count_actions
+    def _merge(df, counts, field):
+        tmp = pd.merge(df, counts.rename(field).to_frame(), left_on="Id", right_index=True, how="left")
+        tmp[field] = tmp[field].fillna(0).astype(int)
+        return tmp
+
+    comments = _merge(comments, comment_votes.groupby(by=["PostCommentId"])["Id"].nunique(), "CommentVoteCount")
+    posts = _merge(posts, post_votes.groupby(by=["PostId"])["Id"].nunique(), "PostVoteCount")
+    posts = _merge(posts, comments.groupby(by=["PostId"])["Id"].nunique(), "PostCommentCount")
+    posts = _merge(posts, comments.groupby(by=["PostId"])["CommentVoteCount"].sum(), "PostCommentVoteCount")
+    answers = posts[posts["PostTypeId"] == 2]
+    posts = _merge(posts, answers.groupby(by=["ParentId"])["Id"].nunique(), "AnswerCount")
+    posts["PostActionCount"] = posts["PostVoteCount"] + posts["PostCommentCount"] + posts["PostCommentVoteCount"]
+    answers = posts[posts["PostTypeId"] == 2]
+    posts = _merge(posts, answers.groupby(by=["ParentId"])["PostActionCount"].sum(), "AllAnswersActionCount")
+    posts["TotalQuestionActionCount"] = posts["PostActionCount"] + posts["AllAnswersActionCount"]
+    posts.loc[posts["PostTypeId"] == 2, "TotalQuestionActionCount"] = 0
+    return posts, comments
+
+
+def run_variant(variant, scale, repeat):
+    import feedback_processing
+
+    dump = synthetic_dump(scale)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    seconds = list()
+    for _ in range(repeat):
+        posts, post_votes, comments, comment_votes = [df.copy() for df in dump]
+        started = time.perf_counter()
+        if variant == "merge":
+            merge_count_actions(posts, post_votes, comments, comment_votes)
+        else:
+            meta = object.__new__(feedback_processing.MetaData)
+            meta.posts, meta.comments = posts, comments
+            meta._count_actions(posts, post_votes, comments, comment_votes)
+        seconds.append(time.perf_counter() - started)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux
+    print("%s %f %f %f" % (variant, min(seconds), np.median(seconds), (peak - baseline) / 1024.))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--variant", choices=VARIANTS)
+    args = parser.parse_args()
+    if args.variant is not None:
+        run_variant(args.variant, args.scale, args.repeat)
+        return
+
+    lines = [
+        "_count_actions, %d post votes, %d runs" % (int(1e7 * args.scale), args.repeat),
+        "%-16s %10s %10s %16s" % ("Variant", "Best, s", "Median, s", "Peak RSS+, MB")
+    ]
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, __file__, "--variant", variant, "--scale", str(args.scale), "--repeat", str(args.repeat)],
+            check=True, capture_output=True, text=True
+        ).stdout.split()
+        lines.append("%-16s %10.2f %10.2f %16.0f" % (variant, float(output[1]), float(output[2]), float(output[3])))
+    print("\n".join(lines))
+    with open(os.path.join(ROOT, "bench_output.txt"), "a") as f:
+        f.write("\n".join(lines) + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
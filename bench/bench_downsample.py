@@ -0,0 +1,80 @@
+# Payload size and render time of report.plot_df with and without downsample_,
+# on a daily series with a few noisy columns.
+#
+#   python bench/bench_downsample.py [--rows 10000 100000 1000000] [--columns 4] [--repeat 3]
+#
+# Figures are saved as html (report.set_output("files")), the payload is the
+# size of that file and the render time covers downsampling, building the
+# figure and serializing it. The table is printed and appended to
+# bench_output.txt in the repo root, next to bench_count_actions.py.
+import os
+import sys
+import time
+import argparse
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report
+
+METHODS = [None, "lttb", "minmax"]
+
+
+def series(rows, columns, seed=1):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        np.abs(rng.normal(0, 1, (rows, columns)).cumsum(axis=0)) + rng.poisson(3, (rows, columns)),
+        index=pd.date_range("2000-01-01", periods=rows, freq="h").rename("Date"),
+        columns=["Series %d" % (index) for index in range(columns)]
+    )
+    return df
+
+
+def measure(df, stacked, method, repeat, folder):
+    seconds = list()
+    for _ in range(repeat):
+        report.set_output("files", folder, ("html",), "bench")
+        started = time.perf_counter()
+        report.plot_df(df, "Benchmark", "Date", "Value", stacked=stacked, need_table=False, downsample=method)
+        seconds.append(time.perf_counter() - started)
+    path = report.ARTIFACTS[-1][0]
+    points = len(report.downsample_(df, stacked, method).index)
+    return points, os.path.getsize(path), min(seconds), np.median(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--columns", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    # plot_bokeh_ still passes legend=, bokeh warns on every line
+    from bokeh.util.warnings import BokehDeprecationWarning
+    warnings.simplefilter("ignore", BokehDeprecationWarning)
+
+    lines = [
+        "downsample_, %d columns, %d runs, PLOT_WIDTH %d" % (args.columns, args.repeat, report.PLOT_WIDTH),
+        "%-9s %-8s %-7s %9s %12s %9s %10s" % ("Rows", "Stacked", "Method", "Points", "Payload, KB", "Best, s", "Median, s")
+    ]
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in args.rows:
+            df = series(rows, args.columns)
+            for stacked in [False, True]:
+                for method in METHODS:
+                    points, size, best, median = measure(df, stacked, method, args.repeat, folder)
+                    lines.append("%-9d %-8s %-7s %9d %12.0f %9.2f %10.2f" % (
+                        rows, stacked, method, points, size / 1024., best, median
+                    ))
+                    print(lines[-1])
+    report.set_output()
+    with open(os.path.join(ROOT, "bench_output.txt"), "a") as f:
+        f.write("\n".join(lines) + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
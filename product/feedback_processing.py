@@ -1,24 +1,15 @@
+import os
 import re
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 import pandas as pd
 import numpy as np
 from dateutil.relativedelta import relativedelta
 from datetime import datetime, timedelta
 
-from bokeh.io import show
-from bokeh.models import ColumnDataSource, FactorRange
-from bokeh.plotting import figure
-from bokeh.palettes import Spectral5
-
-
-import bokeh.io
-bokeh.io.output_notebook()
-
-from google.colab import drive
-from google.colab import auth
-import gspread
-from google.auth import default
-
 import report 
 
 class AnnouncementChecklist:
@@ -48,53 +39,513 @@ class AnnouncementChecklist:
     def get_max_score(self):
             return np.sum([1 for _ in self._fields_to_array()])        
 
+class _Stage:
+    def __init__(self, profiler, name, info):
+        self.profiler = profiler
+        self.name = name
+        self.info = info
+        self.rows = None
+
+    def __enter__(self):
+        path = self.profiler._path
+        path.append(self.name)
+        self.record = dict(self.info, Path="/".join(path), Depth=len(path) - 1)
+        self.profiler.records.append(self.record)
+        self._rss = self.profiler._peak_rss()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.record.update({
+            "WallSeconds": time.perf_counter() - self._wall,
+            "CPUSeconds": time.process_time() - self._cpu,
+            "PeakRSSDelta": self.profiler._peak_rss() - self._rss,
+            "Rows": self.rows
+        })
+        self.profiler._path.pop()
+        return False
+
+
+class _NoStage:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NoProfiler:
+    # The default: stages are a shared no-op, nothing is measured or kept
+    _stage = _NoStage()
+
+    def stage(self, name, **info):
+        return self._stage
+
+_NO_PROFILER = _NoProfiler()
+
+
+class StageProfiler:
+    # Wall time, CPU time, growth of the peak RSS and row counts of nested stages:
+    #   with profiler.stage("read posts.csv") as stage:
+    #       df = ...
+    #       stage.rows = len(df.index)
+    # Pass it as profiler= to MetaData, MainSiteData or SpreadsheetData.
+    def __init__(self):
+        self.records = list()
+        self._path = list()
+
+    @staticmethod
+    def _peak_rss():
+        try:
+            import resource
+        except ImportError:
+            return 0
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    # info: extra fields kept in the record, e.g. QuestionId=...
+    def stage(self, name, **info):
+        return _Stage(self, name, info)
+
+    def to_frame(self):
+        columns = ["Path", "Depth", "WallSeconds", "CPUSeconds", "PeakRSSDelta", "Rows"]
+        df = pd.DataFrame(self.records)
+        return df.reindex(columns=columns + [column for column in df.columns if column not in columns])
+
+    @staticmethod
+    def _json_value(value):
+        # Rows and info fields are often numpy scalars (a .sum(), an Id taken
+        # from a frame) or timestamps, json only knows the Python types
+        if isinstance(value, np.generic):
+            return value.item()
+        if hasattr(value, "isoformat"):
+            return value.isoformat()
+        return str(value)
+
+    def to_json(self, path=None):
+        trace = json.dumps(self.records, indent=1, default=self._json_value)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(trace)
+        return trace
+
+    def summary(self, width=30):
+        # Flame-style: stages nested under their parents, repeated stages
+        # (e.g. one per question) merged, bars scaled to the slowest root stage
+        df = self.to_frame()
+        if len(df.index) == 0:
+            return
+        df["Calls"] = 1
+        stages = df.groupby(by="Path", sort=False).agg({
+            "Depth": "first", "Calls": "sum", "WallSeconds": "sum", "CPUSeconds": "sum", 
+            "PeakRSSDelta": "sum", "Rows": "sum"
+        })
+        total = stages[stages["Depth"] == 0]["WallSeconds"].max()
+        print("%-48s %6s %9s %9s %11s %10s" % ("Stage", "Calls", "Wall, s", "CPU, s", "Peak RSS+", "Rows"))
+        for stage in stages.itertuples():
+            name = "  " * stage.Depth + stage.Index.split("/")[-1]
+            bar = "#" * int(round(width * stage.WallSeconds / total)) if total > 0 else ""
+            print("%-48s %6d %9.3f %9.3f %8.1f MB %10s %s" % (
+                name[:48], stage.Calls, stage.WallSeconds, stage.CPUSeconds,
+                stage.PeakRSSDelta / 2.**20, "%d" % stage.Rows if stage.Rows > 0 else "", bar
+            ))
+
+
 class SpreadsheetData:
-    def __init__(self, spreadsheet_id):
-        self.creds, _ = default()
-        self.gc = gspread.authorize(self.creds)
+    SHEET_TITLE_PATTERN = re.compile(r'meta.stack(overflow|exchange).com/(q|questions)/\d+')
+
+    # client: an authorized gspread client, or anything with the same
+    # open_by_key / worksheets / values_batch_get surface
+    # snapshot_folder: where pulled tables are kept, keyed by the spreadsheet revision
+    def __init__(self, spreadsheet_id, client=None, snapshot_folder=None, profiler=None):
+        self.profiler = profiler if profiler is not None else _NO_PROFILER
+        if client is None:
+            import gspread
+            from google.auth import default
+            self.creds, _ = default()
+            client = gspread.authorize(self.creds)
+        self.gc = client
+        self.spreadsheet_id = spreadsheet_id
         self.speadsheet = self.gc.open_by_key(spreadsheet_id)
+        self.snapshot_folder = snapshot_folder
 
-    def feedback(self, question_id):
+        self._sheet_titles = None
+        self._tables = dict()
+        # question id -> {"Rows", "FetchSeconds", "ParseSeconds"}, FetchSeconds is
+        # the time of the request the sheet was pulled with
+        self.timings = dict()
+
+    def _sheet_index(self):
+        # question id -> worksheet title, the worksheets are listed only once
+        if self._sheet_titles is not None:
+            return self._sheet_titles
+
+        self._sheet_titles = dict()
         for sheet in self.speadsheet.worksheets():
             title = sheet.title
-
-            pattern = 'meta.stack(overflow|exchange).com/(q|questions)/\d+'
-            if len(re.findall(pattern, title)) == 0:
+            if self.SHEET_TITLE_PATTERN.search(title) is None:
                 continue
 
-            numbers = re.findall('\d+', title)
+            numbers = re.findall(r'\d+', title)
             if len(numbers) == 0:
                 continue
 
-            sheet_id = int(numbers[0])
-            if sheet_id != question_id:
-                continue
-
-            values = sheet.get_all_values()
-            df = pd.DataFrame(data=values)
-            df.columns = df.iloc[0]
-            df = df.drop(df.index[0])
-
-            df["AnswerId"] = df["Link"].apply(lambda x: int(re.findall('\d+', x)[0]))
-            df["QuestionId"] = question_id
-            df["Theme"] = df["Theme"].fillna("n/a")
-            df["Theme"] = df["Theme"].replace("", "n/a")
-            return df
-
-        return None            
+            self._sheet_titles.setdefault(int(numbers[0]), title)
+        return self._sheet_titles
+
+    def _revision(self):
+        return getattr(self.speadsheet, "lastUpdateTime", None)
+
+    def _snapshot_path(self):
+        return os.path.join(self.snapshot_folder, "spreadsheet_%s.json" % (self.spreadsheet_id))
+
+    def _load_snapshot(self, revision):
+        if self.snapshot_folder is None or revision is None:
+            return dict()
+        try:
+            with open(self._snapshot_path()) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return dict()
+        if snapshot.get("revision") != revision:
+            return dict()
+        return {int(question_id): values for question_id, values in snapshot["tables"].items()}
+
+    def _save_snapshot(self, revision):
+        if self.snapshot_folder is None or revision is None:
+            return
+        # Other question sets pulled at the same revision stay in the snapshot
+        tables = self._load_snapshot(revision)
+        tables.update(self._tables)
+        os.makedirs(self.snapshot_folder, exist_ok=True)
+        tmp_path = self._snapshot_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"revision": revision, "tables": tables}, f)
+        os.replace(tmp_path, self._snapshot_path())
+
+    def prefetch(self, question_ids, max_workers=1):
+        # Pulls the sheets of all given questions: whatever the snapshot of the
+        # current revision has comes from disk, the rest is split into at most
+        # max_workers batched requests that run on a thread pool. The worksheets
+        # are listed only when the snapshot does not cover all the questions.
+        missing = [id for id in question_ids if id not in self._tables]
+        if len(missing) == 0:
+            return
+
+        revision = self._revision()
+        snapshot = self._load_snapshot(revision)
+        for id in missing:
+            if id in snapshot:
+                self._tables[id] = snapshot[id]
+                self.timings[id] = {"FetchSeconds": 0.0}
+        missing = [id for id in missing if id not in self._tables]
+        if len(missing) == 0:
+            return
+
+        sheet_titles = self._sheet_index()
+        for id in missing:
+            if id not in sheet_titles:
+                # No sheet in this revision, kept as an empty table so the
+                # snapshot answers for it too
+                self._tables[id] = []
+        missing = [id for id in missing if id in sheet_titles]
+        if len(missing) == 0:
+            self._save_snapshot(revision)
+            return
+
+        def _fetch(chunk):
+            started = time.perf_counter()
+            ranges = ["'%s'" % (sheet_titles[id].replace("'", "''")) for id in chunk]
+            response = self.speadsheet.values_batch_get(ranges)
+            return chunk, response, time.perf_counter() - started
+
+        workers = max(1, min(max_workers, len(missing)))
+        chunks = [missing[index::workers] for index in range(workers)]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk, response, elapsed in executor.map(_fetch, chunks):
+                for id, value_range in zip(chunk, response["valueRanges"]):
+                    self._tables[id] = value_range.get("values", [])
+                    self.timings[id] = {"FetchSeconds": elapsed}
+        self._save_snapshot(revision)
 
+    def feedback(self, question_id):
+        with self.profiler.stage("feedback", QuestionId=question_id) as stage:
+            df = self._feedback(question_id)
+            stage.rows = len(df.index) if df is not None else 0
+        return df
+
+    def _feedback(self, question_id):
+        self.prefetch([question_id])
+        values = self._tables.get(question_id)
+        if values is None or len(values) == 0:
+            return None
+
+        started = time.perf_counter()
+        # The batched API trims trailing empty cells, get_all_values did not
+        width = max(len(row) for row in values)
+        df = pd.DataFrame(data=[row + [""] * (width - len(row)) for row in values])
+        df.columns = df.iloc[0]
+        df = df.drop(df.index[0])
+
+        df["AnswerId"] = df["Link"].str.extract(r'(\d+)', expand=False).astype(int)
+        df["QuestionId"] = question_id
+        df["Theme"] = df["Theme"].fillna("n/a")
+        df["Theme"] = df["Theme"].replace("", "n/a")
+
+        self.timings.setdefault(question_id, dict()).update({
+            "Rows": len(df.index),
+            "ParseSeconds": time.perf_counter() - started
+        })
+        return df
+
+    def timings_report(self):
+        report = pd.DataFrame.from_dict(self.timings, orient="index")
+        return report.reindex(columns=["Rows", "FetchSeconds", "ParseSeconds"]).rename_axis("QuestionId").sort_index()
+
+
+def _unique_count(df, by, field):
+    # Ids are primary keys in the dumps, so counting rows gives the same
+    # result as nunique() at a fraction of the cost
+    if df[field].is_unique:
+        return df.groupby(by=[by]).size()
+    return df.groupby(by=[by])[field].nunique()
+
+
+class FrameCache:
+    # Feather snapshots of already-typed frames. A snapshot is valid while every
+    # source file keeps its size and either its mtime or its content hash, and
+    # it was written by the same FORMAT_VERSION and version of the code.
+    FORMAT_VERSION = 1
+
+    # version: of the code that builds the frames, e.g. MetaData.CACHE_VERSION
+    def __init__(self, cache_folder, version=0):
+        self.cache_folder = cache_folder
+        self.version = [self.FORMAT_VERSION, version]
+
+    def _path(self, name):
+        return os.path.join(self.cache_folder, name)
+
+    @staticmethod
+    def _file_hash(path):
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _fingerprint(self, path):
+        stat = os.stat(path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha1": self._file_hash(path)}
+
+    # return: is the snapshot valid, did any mtime have to be refreshed
+    def _check_sources(self, manifest, source_files):
+        if manifest is None or manifest.get("version") != self.version:
+            return False, False
+        if sorted(manifest["sources"].keys()) != sorted(source_files):
+            return False, False
+        touched = False
+        for path in source_files:
+            known = manifest["sources"][path]
+            if not os.path.exists(path):
+                return False, False
+            stat = os.stat(path)
+            if stat.st_size != known["size"]:
+                return False, False
+            if stat.st_mtime_ns != known["mtime"]:
+                # The dump was rewritten, it is still fine if the content is the same
+                if self._file_hash(path) != known["sha1"]:
+                    return False, False
+                known["mtime"] = stat.st_mtime_ns
+                touched = True
+        return True, touched
+
+    def _read_manifest(self, name):
+        try:
+            with open(self._path(name + ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, name, manifest):
+        with open(self._path(name + ".json"), "w") as f:
+            json.dump(manifest, f)
+
+    def _read_tables(self, manifest):
+        from pyarrow import feather
+        try:
+            return {
+                table: feather.read_table(self._path(file_name), memory_map=True).to_pandas()
+                for table, file_name in manifest["tables"].items()
+            }
+        except OSError:
+            return None
+
+    def _write_tables(self, name, frames, source_files, marks=None):
+        from pyarrow import feather
+        os.makedirs(self.cache_folder, exist_ok=True)
+        if os.path.exists(self._path(name + ".json")):
+            os.remove(self._path(name + ".json"))
+        manifest = {"version": self.version, "sources": {path: self._fingerprint(path) for path in source_files}, "tables": {}}
+        if marks is not None:
+            manifest["marks"] = marks
+        for table, df in frames.items():
+            file_name = "%s.%s.feather" % (name, table)
+            # Written aside and renamed, frames still mapped from the old file stay readable
+            feather.write_feather(df, self._path(file_name + ".tmp"), compression="uncompressed")
+            os.replace(self._path(file_name + ".tmp"), self._path(file_name))
+            manifest["tables"][table] = file_name
+        self._write_manifest(name, manifest)
+
+    def _store(self, name, frames, source_files, marks=None):
+        # A frame feather cannot hold (e.g. an object column mixing str and int,
+        # ArrowInvalid / ArrowTypeError) or a full disk only costs the cache:
+        # the manifest is removed before writing, so nothing stale is read later
+        try:
+            self._write_tables(name, frames, source_files, marks)
+        except (OSError, ValueError, TypeError) as e:
+            print("FrameCache: %s is not cached, %s: %s" % (name, type(e).__name__, e))
+
+    def load_or_build(self, name, source_files, build):
+        try:
+            from pyarrow import feather
+        except ImportError:
+            return build()
+
+        manifest = self._read_manifest(name)
+        valid, touched = self._check_sources(manifest, source_files)
+        if valid:
+            frames = self._read_tables(manifest)
+            if frames is not None:
+                if touched:
+                    self._write_manifest(name, manifest)
+                return frames
+
+        frames = build()
+        self._store(name, frames, source_files)
+        return frames
+
+    # build() -> (frames, marks), update(frames, marks) -> (frames, marks).
+    # Like load_or_build, but when the sources changed the previous snapshot
+    # and its marks (e.g. high-water marks) are handed to update() instead
+    # of building from scratch.
+    def load_or_update(self, name, source_files, build, update):
+        try:
+            from pyarrow import feather
+        except ImportError:
+            return build()[0]
+
+        manifest = self._read_manifest(name)
+        valid, touched = self._check_sources(manifest, source_files)
+        # Counters of a state written by another version are not updated, but rebuilt
+        current = manifest is not None and "marks" in manifest and manifest.get("version") == self.version
+        frames = self._read_tables(manifest) if current else None
+        if frames is not None and valid:
+            if touched:
+                self._write_manifest(name, manifest)
+            return frames
+
+        frames, marks = build() if frames is None else update(frames, manifest["marks"])
+        self._store(name, frames, source_files, marks)
+        return frames
 
 ############################################
 
 class MainSiteData:
-    def __init__(self, db_name, project_path_prefix):
+    # Tier code -> (name, minimal monthly EngagementPoints); tiers are cumulative,
+    # a Core user is also counted as Very engaged, Engaged and Active
+    ENGAGEMENT_TIERS = [("Active", 0), ("Engaged", 1), ("Very engaged", 10), ("Core", 100)]
+    # Action counters in tenths of an engagement point
+    ENGAGEMENT_WEIGHTS = {
+        "Questions": 10, "Answers": 10, "Comments": 2, "Edits": 2,
+        "AcceptVotes": 1, "UpVotes": 1, "DownVotes": 1, "CommentVotes": 1,
+        "CloseVotes": 1, "ReopenVotes": 1, "OtherFlags": 1, "Reviews": 1
+    }
+    # Bump when the cached frames change: typing, EngagementPoints, the rollup
+    CACHE_VERSION = 1
+
+    def __init__(self, db_name, project_path_prefix, use_cache=True, compact=False, chunk_rows=500000, profiler=None):
+        self.profiler = profiler if profiler is not None else _NO_PROFILER
         self.project_folder = "%s/%s" % (project_path_prefix, db_name)
-        self._upload_data()
-        self._correct_types()
-        self._new_fields()
+        self.cache = FrameCache("%s/.cache" % (self.project_folder), self.CACHE_VERSION) if use_cache else None
+        # compact: read monthly_actions.csv in chunks of chunk_rows with unsigned counters,
+        # int32 ids, monthly periods for OnDate and EngagementPoints computed per chunk
+        self.compact = compact
+        self.chunk_rows = chunk_rows
+        self.memory_usage = None
+        with self.profiler.stage("MainSiteData") as stage:
+            with self.profiler.stage("_load_typed_data"):
+                self._load_typed_data()
+            with self.profiler.stage("_new_fields"):
+                self._new_fields()
+            stage.rows = len(self.actions.index)
+        self._date_order = None
+        self._rollup = None
+
+    def _cache_name(self):
+        return "main_compact" if self.compact else "main"
+
+    def _load_typed_data(self):
+        def _build():
+            if self.compact:
+                self._upload_compact_data()
+            else:
+                self._upload_data()
+                with self.profiler.stage("_correct_types"):
+                    self._correct_types()
+            return {"actions": self.actions}
+
+        if self.cache is None:
+            _build()
+            return
+        frames = self.cache.load_or_build(self._cache_name(), ["%s/monthly_actions.csv" % (self.project_folder)], _build)
+        self.actions = frames["actions"]
 
     def _upload_data(self):
-        self.actions = pd.read_csv("%s/monthly_actions.csv" % (self.project_folder))         
+        with self.profiler.stage("read monthly_actions.csv") as stage:
+            self.actions = pd.read_csv("%s/monthly_actions.csv" % (self.project_folder))         
+            stage.rows = len(self.actions.index)
+
+    def _upload_compact_data(self):
+        read_bytes = 0
+        chunks = list()
+        reader = pd.read_csv("%s/monthly_actions.csv" % (self.project_folder), chunksize=self.chunk_rows)
+        while True:
+            with self.profiler.stage("read monthly_actions.csv chunk") as stage:
+                chunk = next(reader, None)
+                stage.rows = len(chunk.index) if chunk is not None else 0
+            if chunk is None:
+                break
+            read_bytes += chunk.memory_usage(deep=True).sum()
+            chunk["OnDate"] = pd.to_datetime(chunk["OnDate"]).dt.to_period("M")
+            chunk["UserId"] = chunk["UserId"].fillna(-1).astype(np.int32)
+            chunk["AccountId"] = chunk["AccountId"].fillna(-1).astype(np.int32)
+            points = np.zeros(len(chunk.index), dtype=np.int64)
+            missing = np.zeros(len(chunk.index), dtype=bool)
+            for field, weight in self.ENGAGEMENT_WEIGHTS.items():
+                missing |= chunk[field].isna().values
+                values = chunk[field].fillna(0)
+                points += weight * values.values.astype(np.int64)
+                chunk[field] = pd.to_numeric(values, downcast="unsigned")
+            # A missing counter leaves the points unknown, as in the default formula
+            chunk["EngagementPoints"] = np.where(missing, np.nan, points / 10.).astype(np.float32)
+            chunks.append(chunk)
+
+        self.actions = pd.concat(chunks, ignore_index=True)
+        del chunks
+        # Periods would be deduplicated as objects, their ordinals hash as plain ints
+        duplicated = pd.DataFrame({
+            "OnDate": self.actions["OnDate"].array.asi8, 
+            "UserId": self.actions["UserId"].values
+        }).duplicated()
+        self.actions = self.actions[~duplicated.values]
+        self.memory_usage = {"Read": read_bytes, "Compact": self.actions.memory_usage(deep=True).sum()}
+        print("monthly_actions.csv: %0.1f MB as read, %0.1f MB compact" % (
+            self.memory_usage["Read"] / 2.**20, 
+            self.memory_usage["Compact"] / 2.**20
+        ))
 
     def _correct_types(self):
         self.actions["OnDate"] = pd.to_datetime(
@@ -111,6 +562,9 @@ class MainSiteData:
         # Engaged: 1 engagment point
         # Very engaged: 10 * Engaged
         # Core: 10 * Very engaged
+        if "EngagementPoints" in self.actions:
+            # Computed per chunk by the compact loading
+            return
         self.actions["EngagementPoints"] = self.actions["Questions"] + self.actions["Answers"] + 1/5. * self.actions["Comments"] + 1/5. * self.actions["Edits"] + 1/10. * (
             self.actions["AcceptVotes"] + 
             self.actions["UpVotes"] + 
@@ -122,26 +576,258 @@ class MainSiteData:
             self.actions["Reviews"]
         )        
 
+    @staticmethod
+    def _timestamps(dates):
+        # OnDate is a monthly period in the compact mode
+        dates = pd.Series(dates)
+        return (dates.dt.to_timestamp() if isinstance(dates.dtype, pd.PeriodDtype) else dates).values
+
+    def _tiers(self, points):
+        # NaN points (a missing counter) fall below every threshold, as with >= comparisons
+        thresholds = [threshold for _, threshold in self.ENGAGEMENT_TIERS[1:]]
+        points = np.nan_to_num(np.asarray(points, dtype=np.float64), nan=0.)
+        return np.searchsorted(thresholds, points, side="right").astype(np.int8)
+
+    def _cumulative(self, counts):
+        # Per tier code counts -> users at this tier or above, named by tier
+        counts = counts.reindex(columns=range(len(self.ENGAGEMENT_TIERS)), fill_value=0)
+        counts = counts.iloc[:, ::-1].cumsum(axis=1).iloc[:, ::-1]
+        counts.columns = [name for name, _ in self.ENGAGEMENT_TIERS]
+        return counts
+
+    def _date_index(self):
+        # Row positions of the actions sorted by OnDate, so a window is a searchsorted slice
+        if self._date_order is None:
+            dates = self._timestamps(self.actions["OnDate"])
+            self._date_order = np.argsort(dates, kind="stable")
+            self._sorted_dates = dates[self._date_order]
+        return self._date_order, self._sorted_dates
+
+    def engagement(self, end_dates, months=1):
+        # Per user activity in the months before each of end_dates,
+        # both window ends excluded: (end_date - months; end_date).
+        # Rows are indexed by (Window, UserId), Window is the position in end_dates.
+        # EngagementPoints are averaged over the months a window actually holds
+        # (months - 1 when end_date is a month start), so tiers keep their monthly thresholds.
+        order, sorted_dates = self._date_index()
+        end_dates = pd.to_datetime(pd.Series(end_dates)).values
+        starts = np.array([np.datetime64(pd.Timestamp(end) - relativedelta(months=months)) for end in end_dates], dtype=sorted_dates.dtype)
+        lo = np.searchsorted(sorted_dates, starts, side="right")
+        hi = np.maximum(np.searchsorted(sorted_dates, end_dates, side="left"), lo)
+        positions = np.concatenate([order[l:h] for l, h in zip(lo, hi)] + [np.empty(0, dtype=order.dtype)])
+        windows = np.repeat(np.arange(len(end_dates)), hi - lo)
+        # Distinct OnDate values in sorted_dates[lo:hi], 1 for an empty window:
+        # changes[i + 1] is the number of value changes in sorted_dates[:i + 1]
+        changes = np.concatenate([[0, 0], np.cumsum(sorted_dates[1:] != sorted_dates[:-1])])
+        window_months = changes[hi] - changes[np.minimum(lo + 1, hi)] + 1
+
+        fields = self.actions.select_dtypes(include=np.number).columns.drop(["UserId", "AccountId"], errors="ignore")
+        rows = self.actions.iloc[positions]
+        result = rows[fields].groupby([pd.Index(windows, name="Window"), pd.Index(rows["UserId"].values, name="UserId")]).sum()
+        result["EngagementPoints"] = result["EngagementPoints"] / window_months[result.index.get_level_values("Window")]
+
+        result["Tier"] = self._tiers(result["EngagementPoints"].values)
+        return result
+
+    def tier_counts(self, engagement, windows):
+        # Cumulative number of users per tier for each of the first windows of engagement()
+        counts = engagement.groupby(level="Window")["Tier"].value_counts().unstack(fill_value=0)
+        return self._cumulative(counts.reindex(index=range(windows), fill_value=0))
+
+    def rollup(self):
+        # Monthly tiers computed once and persisted next to the typed data,
+        # rebuilt by the cache when monthly_actions.csv changes:
+        #   monthly_tiers - cumulative tier counts, one row per OnDate
+        #   user_tiers - tier code for every (OnDate, UserId) of the actions
+        if self._rollup is None:
+            def _build():
+                user_tiers = pd.DataFrame({
+                    "OnDate": self.actions["OnDate"].array,
+                    "UserId": self.actions["UserId"].values,
+                    "Tier": self._tiers(self.actions["EngagementPoints"].values)
+                }).sort_values(by=["OnDate", "UserId"], ignore_index=True)
+                counts = user_tiers.groupby(by="OnDate")["Tier"].value_counts().unstack(fill_value=0)
+                return {"monthly_tiers": self._cumulative(counts).reset_index(), "user_tiers": user_tiers}
+
+            if self.cache is None:
+                frames = _build()
+            else:
+                frames = self.cache.load_or_build(
+                    self._cache_name() + "_rollup", 
+                    ["%s/monthly_actions.csv" % (self.project_folder)], 
+                    _build
+                )
+            self._rollup = (frames["monthly_tiers"].set_index("OnDate"), frames["user_tiers"])
+        return self._rollup
+
+    def monthly_tier_counts(self, end_dates):
+        # Same as tier_counts(engagement(end_dates, months=1)) read from the rollup:
+        # a one month window (end_date - 1 month; end_date) holds at most one OnDate
+        monthly_tiers, _ = self.rollup()
+        months = self._timestamps(monthly_tiers.index)
+        end_dates = pd.to_datetime(pd.Series(end_dates)).values
+        starts = np.array([np.datetime64(pd.Timestamp(end) - relativedelta(months=1)) for end in end_dates], dtype=months.dtype)
+        lo = np.searchsorted(months, starts, side="right")
+        hi = np.searchsorted(months, end_dates, side="left")
+        counts = monthly_tiers.iloc[np.minimum(lo, len(months) - 1)].reset_index(drop=True)
+        counts.loc[hi <= lo, :] = 0
+        counts.index.name = "Window"
+        return counts
+
 class MetaData:
-    def __init__(self, spreadsheet_id, db_name, questions_in_the_series, project_path_prefix):
+    CSV_FILES = {
+        "users": "users.csv",
+        "posts": "posts.csv",
+        "post_votes": "post_votes.csv",
+        "comments": "comments.csv",
+        "comment_votes": "comment_votes.csv",
+        "moderators": "moderators.csv",
+        "employees": "employee_accounts.csv"
+    }
+    # Tables that grow between dumps: the incremental mode counts the actions
+    # of rows with an Id above the stored high-water mark only. Of the votes
+    # tables it reads just those rows and the ones with a newer DeletionDate.
+    DELTA_TABLES = ["posts", "post_votes", "comments", "comment_votes"]
+    # Bump when the cached frames change: _correct_types, _count_actions, the delta logic
+    CACHE_VERSION = 1
+    # Rows of these change in place (Score, ViewCount, edits), so old rows
+    # take every source column from the new dump and keep their counters
+    REFRESHED_TABLES = ["posts", "comments"]
+
+    def __init__(self, spreadsheet_id, db_name, questions_in_the_series, project_path_prefix, use_cache=True, feedback_workers=4, incremental=False, profiler=None, spreadsheet_client=None):
+        self.profiler = profiler if profiler is not None else _NO_PROFILER
         self.spreadsheet_id = spreadsheet_id
+        # spreadsheet_client: passed to SpreadsheetData as client, Google credentials are used when None
+        self.spreadsheet_client = spreadsheet_client
+        self.feedback_workers = feedback_workers
         self.questions_in_the_series = questions_in_the_series
         self.project_folder = "%s/%s" % (project_path_prefix, db_name)
+        self.cache = FrameCache("%s/.cache" % (self.project_folder), self.CACHE_VERSION) if use_cache else None
+        # incremental: keep the typed tables with their action counters in the cache
+        # and apply only the new rows of every dump to them (needs use_cache)
+        self.incremental = incremental
+        with self.profiler.stage("MetaData") as stage:
+            with self.profiler.stage("_load_typed_data"):
+                self._load_typed_data()
+            with self.profiler.stage("open spreadsheet"):
+                self.feedback_source = SpreadsheetData(
+                    self.spreadsheet_id,
+                    client=self.spreadsheet_client,
+                    snapshot_folder=self.cache.cache_folder if self.cache is not None else None,
+                    profiler=self.profiler
+                )
+            with self.profiler.stage("_new_fields"):
+                self._new_fields()
+            stage.rows = len(self.posts.index)
+
+    def _load_typed_data(self):
+        def _build():
+            self._upload_data()
+            with self.profiler.stage("_correct_types"):
+                self._correct_types()
+            return {name: getattr(self, name) for name in self.CSV_FILES.keys()}
+
+        if self.cache is None:
+            _build()
+            return
+        source_files = ["%s/%s" % (self.project_folder, file_name) for file_name in self.CSV_FILES.values()]
+        if self.incremental:
+            frames = self.cache.load_or_update("meta_state", source_files, self._build_state, self._update_state)
+        else:
+            frames = self.cache.load_or_build("meta", source_files, _build)
+        for name, df in frames.items():
+            setattr(self, name, df)
+
+    def _high_water_marks(self):
+        marks = dict()
+        for name in self.DELTA_TABLES:
+            df = getattr(self, name)
+            deletion = df["DeletionDate"].max()
+            marks[name] = {
+                "Id": int(df["Id"].max()) if len(df.index) else -1,
+                "DeletionDate": None if pd.isnull(deletion) else deletion.isoformat()
+            }
+        return marks
+
+    def _build_state(self):
         self._upload_data()
-        self._correct_types()
-        self._new_fields()
+        with self.profiler.stage("_correct_types"):
+            self._correct_types()
+        with self.profiler.stage("count actions"):
+            self._count_actions(self.posts, self.post_votes, self.comments, self.comment_votes)
+        return {name: getattr(self, name) for name in self.CSV_FILES.keys()}, self._high_water_marks()
+
+    def _read_delta(self, file_name, mark, refresh=False):
+        # The incremental state lives in the feather cache, so pyarrow is there:
+        # its reader drops the old rows before any Python object is created.
+        # Dates are kept as text like pd.read_csv does, _correct_types parses them.
+        from pyarrow import csv, compute
+
+        path = "%s/%s" % (self.project_folder, file_name)
+        columns = pd.read_csv(path, nrows=0).columns
+        table = csv.read_csv(path, convert_options=csv.ConvertOptions(
+            column_types={column: "string" for column in columns if column.endswith("Date")},
+            strings_can_be_null=True
+        ))
+        if refresh:
+            return table.to_pandas()
+        table = table.filter(compute.or_(
+            compute.greater(table["Id"], mark["Id"]),
+            compute.is_valid(table["DeletionDate"])
+        ))
+        delta = table.to_pandas()
+        if mark["DeletionDate"] is not None:
+            # Only deletions newer than the previous dump are news
+            deleted_before = pd.to_datetime(delta["DeletionDate"]) <= pd.Timestamp(mark["DeletionDate"])
+            delta = delta[(delta["Id"] > mark["Id"]) | ~deleted_before]
+        return delta.reset_index(drop=True)
+
+    def _upload_delta(self, marks):
+        for name, file_name in self.CSV_FILES.items():
+            if name not in self.DELTA_TABLES:
+                setattr(self, name, self._read_csv(file_name))
+                continue
+            with self.profiler.stage("read delta " + file_name) as stage:
+                setattr(self, name, self._read_delta(file_name, marks[name], refresh=name in self.REFRESHED_TABLES))
+                stage.rows = len(getattr(self, name).index)
+
+    def _update_state(self, frames, marks):
+        self._upload_delta(marks)
+        with self.profiler.stage("_correct_types"):
+            self._correct_types()
+
+        new_rows = dict()
+        for name in self.DELTA_TABLES:
+            state, delta = frames[name], getattr(self, name)
+            known = delta["Id"] <= marks[name]["Id"]
+            if name in self.REFRESHED_TABLES:
+                old_rows = delta[known]
+                positions = pd.Index(old_rows["Id"]).get_indexer(state["Id"])
+                found = positions >= 0
+                for column in old_rows.columns.drop("Id") if found.any() else []:
+                    fresh = pd.Series(old_rows[column].values[positions.clip(0)], index=state.index)
+                    state[column] = fresh.where(found, state[column])
+            else:
+                # Rows deleted since the last dump only get their DeletionDate,
+                # the counters include deleted rows like on a full load
+                deletions = pd.Series(delta.loc[known, "DeletionDate"].values, index=delta.loc[known, "Id"].values)
+                state["DeletionDate"] = state["Id"].map(deletions).fillna(state["DeletionDate"])
+            new_rows[name] = delta[~known]
+            setattr(self, name, pd.concat([state, new_rows[name]], ignore_index=True))
+
+        with self.profiler.stage("count actions"):
+            self._count_actions(new_rows["posts"], new_rows["post_votes"], new_rows["comments"], new_rows["comment_votes"])
+        return {name: getattr(self, name) for name in self.CSV_FILES.keys()}, self._high_water_marks()
+
+    def _read_csv(self, file_name):
+        with self.profiler.stage("read " + file_name) as stage:
+            df = pd.read_csv("%s/%s" % (self.project_folder, file_name))
+            stage.rows = len(df.index)
+        return df
 
     def _upload_data(self):
-        self.users = pd.read_csv("%s/users.csv" % (self.project_folder)) 
-        self.posts = pd.read_csv("%s/posts.csv" % (self.project_folder)) 
-        self.post_votes = pd.read_csv("%s/post_votes.csv" % (self.project_folder)) 
-        self.comments = pd.read_csv("%s/comments.csv" % (self.project_folder)) 
-        self.comment_votes = pd.read_csv("%s/comment_votes.csv" % (self.project_folder)) 
-        self.moderators = pd.read_csv("%s/moderators.csv" % (self.project_folder)) 
-        self.employees = pd.read_csv("%s/employee_accounts.csv" % (self.project_folder)) 
-
-        self.feedback_source = SpreadsheetData(self.spreadsheet_id)
-
+        for name, file_name in self.CSV_FILES.items():
+            setattr(self, name, self._read_csv(file_name))
 
     def _correct_types(self):
         self.comment_votes["CreationDate"] = pd.to_datetime(
@@ -184,61 +870,90 @@ class MetaData:
         self.posts["Empty"] = ""
         '''
         Let us calculate action counts
-        '''      
-        tmp = pd.merge(
-            self.comments, 
-            self.comment_votes.groupby(by=["PostCommentId"])["Id"].nunique().rename("CommentVoteCount").to_frame(),
-            left_on="Id", right_on="PostCommentId", how="left")
-        tmp['CommentVoteCount'] = tmp['CommentVoteCount'].fillna(0).astype(int)
-        self.comments = tmp
-
-        tmp = pd.merge(
-            self.posts, 
-            self.post_votes.groupby(by=["PostId"])["Id"].nunique().rename("PostVoteCount").to_frame(),
-            left_on="Id", right_on="PostId", how="left")
-        tmp['PostVoteCount'] = tmp['PostVoteCount'].fillna(0).astype(int)
-        self.posts = tmp
-
-        tmp = pd.merge(
-            self.posts, 
-            self.comments.groupby(by=["PostId"])["Id"].nunique().rename("PostCommentCount").to_frame(),
-            left_on="Id", right_on="PostId", how="left")
-        tmp['PostCommentCount'] = tmp['PostCommentCount'].fillna(0).astype(int)
-        self.posts = tmp  
-
-        tmp = pd.merge(
-            self.posts, 
-            self.comments.groupby(by=["PostId"])["CommentVoteCount"].sum().rename("PostCommentVoteCount").to_frame(),
-            left_on="Id", right_on="PostId", how="left")
-        tmp['PostCommentVoteCount'] = tmp['PostCommentVoteCount'].fillna(0).astype(int)             
-        self.posts = tmp
-
-        answers = self.posts[self.posts["PostTypeId"] == 2]
-        tmp = pd.merge(
-            self.posts, 
-            answers.groupby(by=["ParentId"])["Id"].nunique().rename("AnswerCount").to_frame(),
-            left_on="Id", right_on="ParentId", how="left")
-        tmp['AnswerCount'] = tmp['AnswerCount'].fillna(0).astype(int)
-        self.posts = tmp
-
-        self.posts["PostActionCount"] = self.posts["PostVoteCount"] + self.posts["PostCommentCount"] + self.posts["PostCommentVoteCount"]
+        '''
+        if "PostActionCount" not in self.posts:
+            # Already counted in the incremental state otherwise
+            with self.profiler.stage("count actions"):
+                self._count_actions(self.posts, self.post_votes, self.comments, self.comment_votes)
+
+        with self.profiler.stage("merge users") as stage:
+            self.posts = pd.merge(
+                self.posts,
+                self.users[['Id', 'UserTypeId', "Reputation", "IsModerator"]].rename(columns={"Id":"OwnerUserId"}),
+                left_on="OwnerUserId", right_on="OwnerUserId", how="left")
+            stage.rows = len(self.posts.index)
+
+        with self.profiler.stage("_ingest_feedback"):
+            self._ingest_feedback()
+
+        with self.profiler.stage("merge feedback") as stage:
+            self.all_feedback = pd.merge(
+                self.posts, self.feedback, 
+                left_on="Id", right_on="AnswerId", how="inner"
+            )
+            self.all_feedback["Theme"] = self.all_feedback["Theme"].astype(str)
+            stage.rows = len(self.all_feedback.index)
+        self._theme_cube = None
+
+    def _count_actions(self, posts, post_votes, comments, comment_votes):
+        # Adds the actions of the given rows to the counters of self.posts and self.comments.
+        # The rows are the whole tables on a full load and only the new ones
+        # on an incremental load, so every counter is a sum of per-row deltas.
+        # Every counter is aggregated once per source table and attached with
+        # an index-aligned map, so the posts frame is never copied by a merge.
+        def _add(df, key, counters):
+            for column in counters.columns:
+                current = df[column].fillna(0).astype(int) if column in df else 0
+                df[column] = current + df[key].map(counters[column]).fillna(0).astype(int)
+
+        comment_votes_delta = _unique_count(comment_votes, "PostCommentId", "Id").rename("CommentVoteCount")
+        _add(self.comments, "Id", comment_votes_delta.to_frame())
+
+        post_counters = pd.concat([
+            _unique_count(post_votes, "PostId", "Id").rename("PostVoteCount"),
+            _unique_count(comments, "PostId", "Id").rename("PostCommentCount"),
+            self.comments["Id"].map(comment_votes_delta).groupby(self.comments["PostId"]).sum().rename("PostCommentVoteCount")
+        ], axis=1).fillna(0)
+        post_counters["PostActionCount"] = post_counters.sum(axis=1)
+        _add(self.posts, "Id", post_counters)
 
         answers = self.posts[self.posts["PostTypeId"] == 2]
-        tmp = pd.merge(
-            self.posts, 
-            answers.groupby(by=["ParentId"])["PostActionCount"].sum().rename("AllAnswersActionCount").to_frame(),
-            left_on="Id", right_on="ParentId", how="left")
-        tmp['AllAnswersActionCount'] = tmp['AllAnswersActionCount'].fillna(0).astype(int)
-        self.posts = tmp
+        new_answers = posts[posts["PostTypeId"] == 2]
+        question_counters = pd.concat([
+            _unique_count(new_answers, "ParentId", "Id").rename("AnswerCount"),
+            answers["Id"].map(post_counters["PostActionCount"]).groupby(answers["ParentId"]).sum().rename("AllAnswersActionCount")
+        ], axis=1)
+        _add(self.posts, "Id", question_counters)
 
         self.posts["TotalQuestionActionCount"] = self.posts["PostActionCount"] + self.posts["AllAnswersActionCount"] 
         self.posts.loc[self.posts["PostTypeId"] == 2, "TotalQuestionActionCount"] = 0
 
-        self.posts = pd.merge(
-            self.posts,
-            self.users[['Id', 'UserTypeId', "Reputation", "IsModerator"]].rename(columns={"Id":"OwnerUserId"}),
-            left_on="OwnerUserId", right_on="OwnerUserId", how="left")
-
+    def theme_cube(self):
+        # Number of answers per (QuestionId, Mood, Theme), built once from all_feedback
+        if self._theme_cube is None:
+            feedback = pd.DataFrame({
+                "QuestionId": self.all_feedback["QuestionId"].values,
+                "Mood": self.all_feedback["Mood"].astype("category").values,
+                "Theme": self.all_feedback["Theme"].astype("category").values,
+                "AnswerId": self.all_feedback["AnswerId"].values
+            })
+            self._theme_cube = feedback.groupby(by=["QuestionId", "Mood", "Theme"], observed=True)["AnswerId"].count().rename("ThemeCount")
+        return self._theme_cube
+
+    def theme_trend(self, mood=None, share=False):
+        # Questions x themes: how often every theme comes up across the series,
+        # for one mood or for all of them; share=True gives percents per question
+        cube = self.theme_cube()
+        if mood is not None:
+            cube = cube[cube.index.get_level_values("Mood") == mood]
+        trend = cube.groupby(level=["QuestionId", "Theme"], observed=True).sum().unstack("Theme", fill_value=0)
+        if share:
+            trend = trend.div(trend.sum(axis=1), axis=0) * 100
+        return trend
+
+    def _ingest_feedback(self):
+        with self.profiler.stage("prefetch"):
+            self.feedback_source.prefetch(self.questions_in_the_series, max_workers=self.feedback_workers)
         feedback_list = list()
         for id in self.questions_in_the_series:
             f = self.feedback_source.feedback(id)
@@ -246,11 +961,8 @@ class MetaData:
                 continue
             feedback_list.append(f)
 
-        self.all_feedback = pd.merge(
-            self.posts, pd.concat(feedback_list, axis=0), 
-            left_on="Id", right_on="AnswerId", how="inner"
-        )
-        self.all_feedback["Theme"] = self.all_feedback["Theme"].astype(str)
+        self.feedback = pd.concat(feedback_list, axis=0)
+        self.feedback_timings = self.feedback_source.timings_report()
 
 
         ###############################################################################
@@ -337,6 +1049,48 @@ class Grader:
 
         return grade, results
 
+    @staticmethod
+    def grade_table(meta_site, question_ids=None):
+        # Reach and feedback grades of every employee question (or of question_ids) at once:
+        # percentile ranks come from one sort + searchsorted per metric,
+        # mood shares from one pivot of all_feedback.
+        employee_ids = meta_site.users[meta_site.users["UserTypeId"] == 5]["AccountId"].unique()
+        employee_posts = meta_site.posts[(meta_site.posts["AccountId"].isin(employee_ids)) & (meta_site.posts["PostTypeId"] == 1)]
+
+        def _scores(field):
+            values = employee_posts[field].values.astype(float)
+            # The share of employee questions with a strictly smaller value, like _get_score
+            scores = np.searchsorted(np.sort(values), values, side="left") / float(len(values))
+            return np.where(np.isnan(values), 0, scores) * 100
+
+        table = pd.DataFrame({
+            "QuestionId": employee_posts["Id"].values,
+            "ViewCount": _scores("ViewCount"),
+            "Interest": _scores("TotalQuestionActionCount")
+        }).drop_duplicates(subset=["QuestionId"]).set_index("QuestionId")
+        # The same categorization as in reach_grade
+        view_count, interest = table["ViewCount"], table["Interest"]
+        table["ReachGrade"] = np.select([
+            ((view_count >= 80) & (interest > 50)) | ((view_count > 50) & (interest >= 80)),
+            (view_count < 50) | (interest < 50)
+        ], ["green", "red"], "yellow")
+
+        moods = meta_site.all_feedback.pivot_table(index="QuestionId", columns="Mood", values="Score", aggfunc="sum", fill_value=0)
+        moods = moods.reindex(columns=["positive", "neutral", "negative"], fill_value=0)
+        total = meta_site.all_feedback.groupby(by="QuestionId")["Score"].sum()
+        for mood, column in [("positive", "Positive"), ("neutral", "Neutral"), ("negative", "Negative")]:
+            table[column] = (moods[mood] / total.astype(float) * 100).reindex(table.index)
+        # The same categorization as in feedback_grade, no grade without feedback
+        table["FeedbackGrade"] = np.select([
+            table["Positive"].isna(),
+            table["Positive"] >= 50,
+            table["Negative"] >= 50
+        ], [None, "green", "red"], "yellow")
+
+        if question_ids is not None:
+            table = table.reindex(question_ids)
+        return table
+
 ###############################################################################
 
 class QuestionFeedback:
@@ -347,24 +1101,27 @@ class QuestionFeedback:
         self.q_data = meta_site.all_feedback[meta_site.all_feedback["ParentId"] == question_id]
 
     def themes(self, n_top=3):
-        def _get_themes(df, question_id, mood):
-            feedback = df[(df["QuestionId"] == question_id) & (df["Mood"] == mood)]
-            tmp = feedback.groupby(by=["Theme"])["AnswerId"].count().rename("ThemeCount").to_frame().reset_index()
-            tmp = tmp.sort_values(by=["ThemeCount"], ascending=False)
-            result = list()
-            for _, row in tmp.iterrows():
-                result.append((row["Theme"], row["ThemeCount"]))
-            return result
-
-        def _get_top_themes(df, question_id, n):
-            feedback = df[df["QuestionId"] == question_id]
-            tmp = feedback.groupby(by=["Theme"])["AnswerId"].count().rename("ThemeCount").to_frame().reset_index()
-            return tmp.sort_values(by=["ThemeCount"], ascending=False).head(n)["Theme"].unique().tolist()
-
-        top = _get_top_themes(self.meta_site.all_feedback, self.question_id, n_top)
-        positive = _get_themes(self.meta_site.all_feedback, self.question_id, "positive")
-        neutral = _get_themes(self.meta_site.all_feedback, self.question_id, "neutral")
-        negative = _get_themes(self.meta_site.all_feedback, self.question_id, "negative")
+        cube = self.meta_site.theme_cube()
+        if self.question_id in cube.index.get_level_values("QuestionId"):
+            cube = cube.xs(self.question_id, level="QuestionId")
+        else:
+            cube = cube.iloc[:0].droplevel("QuestionId")
+
+        def _get_themes(cube, mood):
+            if mood not in cube.index.get_level_values("Mood"):
+                return list()
+            tmp = cube.xs(mood, level="Mood")
+            tmp = tmp[tmp > 0].sort_index().to_frame().sort_values(by=["ThemeCount"], ascending=False)
+            return [(theme, count) for theme, count in tmp["ThemeCount"].items()]
+
+        def _get_top_themes(cube, n):
+            tmp = cube.groupby(level="Theme", observed=True).sum().sort_index().to_frame()
+            return tmp.sort_values(by=["ThemeCount"], ascending=False).head(n).index.unique().tolist()
+
+        top = _get_top_themes(cube, n_top)
+        positive = _get_themes(cube, "positive")
+        neutral = _get_themes(cube, "neutral")
+        negative = _get_themes(cube, "negative")
 
         return top, positive, neutral, negative
 
@@ -391,30 +1148,25 @@ class QuestionFeedback:
             print("- %s: %d" % (theme, cnt))
 
 
-    def domain_experts(self, domain_actions_threshold):
+    def domain_experts(self, domain_actions_threshold, months=1):
 
         the_date = self.meta_site.posts[self.meta_site.posts["Id"] == self.question_id]["CreationDate"].values[0]
-
-        ts = pd.to_datetime(str(the_date)) 
-        threshold = ts - relativedelta(months=1)
-
-        tmp = self.main_site.actions[(self.main_site.actions["OnDate"] > threshold) & (self.main_site.actions["OnDate"] < ts)]
-        # Lest us check that we are looking at only one month of data.
-        # If we want to do it for a longer period
-        # we will need to redo the logic with EngagementPoints
-
-        assert(tmp["OnDate"].nunique() == 1)
-
-        active_users = tmp
-        engaged_users = tmp[tmp["EngagementPoints"] >= 1]
-        very_engaged_users = tmp[tmp["EngagementPoints"] >= 10]
-        core_users = tmp[tmp["EngagementPoints"] >= 100]
-
-        print("Engaged users on the main site on the month prior posting the announcement:")
-        print("- Active: %d" % (len(active_users.index)))
-        print("- Engaged: %d (%0.2f%%)" % (len(engaged_users.index), float(len(engaged_users.index))/len(active_users.index) * 100))
-        print("- Very engaged: %d (%0.2f%%)" % (len(very_engaged_users.index), float(len(very_engaged_users.index))/len(active_users.index) * 100))
-        print("- Core: %d (%0.2f%%)" % (len(core_users.index), float(len(core_users.index))/len(active_users.index) * 100))
+        period = "on the month" if months == 1 else "in the %d months" % (months)
+
+        # Reviews / Answers / Edits are summed over the window,
+        # EngagementPoints are per month so the tiers mean the same for any window
+        engagement = self.main_site.engagement([the_date], months)
+        # The window may hold no actions at all, e.g. one month before a month start
+        active_users = engagement.reset_index(level="Window", drop=True).reset_index()
+        if months == 1:
+            tiers = self.main_site.monthly_tier_counts([the_date]).iloc[0]
+        else:
+            tiers = self.main_site.tier_counts(engagement, 1).iloc[0]
+
+        print("Engaged users on the main site %s prior posting the announcement:" % (period))
+        print("- Active: %d" % (tiers["Active"]))
+        for name in tiers.index[1:]:
+            print("- %s: %d (%0.2f%%)" % (name, tiers[name], float(tiers[name])/max(tiers["Active"], 1) * 100))
 
         # Collecting all actions on the target question
         answers_df = self.meta_site.posts[self.meta_site.posts["ParentId"] == self.question_id]
@@ -427,15 +1179,11 @@ class QuestionFeedback:
         participants_ids = list(set(answers_df["OwnerUserId"].values.tolist() + post_votes_df["UserId"].values.tolist() + comments_df["UserId"].values.tolist() + commnet_votes_df["UserId"].values.tolist()))
 
         active_meta = active_users[active_users["UserId"].isin(participants_ids)]
-        engaged_meta = engaged_users[engaged_users["UserId"].isin(participants_ids)]
-        very_engaged_meta = very_engaged_users[very_engaged_users["UserId"].isin(participants_ids)]
-        core_meta = core_users[core_users["UserId"].isin(participants_ids)]
+        meta_tiers = self.main_site.tier_counts(engagement[engagement.index.get_level_values("UserId").isin(participants_ids)], 1).iloc[0]
 
         print("Users that somehow acted on the meta post (%d total):" % (len(participants_ids)))
-        print(" - Active: %d" % (len(active_meta.index)))
-        print(" - Engaged: %d" % (len(engaged_meta.index)))
-        print(" - Very engaged: %d" % (len(very_engaged_meta.index)))
-        print(" - Core: %d" % (len(core_meta.index)))
+        for name in meta_tiers.index:
+            print(" - %s: %d" % (name, meta_tiers[name]))
 
         positive_answer_users = self.meta_site.all_feedback[self.meta_site.all_feedback["Mood"] == "positive"]["OwnerUserId"].values.tolist()
         negative_answer_users = self.meta_site.all_feedback[self.meta_site.all_feedback["Mood"] == "negative"]["OwnerUserId"].values.tolist()
@@ -450,7 +1198,7 @@ class QuestionFeedback:
             print("%d active %s have participated (all actions) in the post (%0.2f%% of all active %s on the main site)." % (
                 df[df[field] >= domain_actions_threshold]["UserId"].nunique(),
                 title.lower(), 
-                100 * (df[df[field] >= domain_actions_threshold]["UserId"].nunique() / float(tmp["UserId"].nunique())),
+                100 * (df[df[field] >= domain_actions_threshold]["UserId"].nunique() / float(max(tmp["UserId"].nunique(), 1))),
                 title.lower()
             ))
 
@@ -466,10 +1214,7 @@ class QuestionFeedback:
             print("- Neutral: %d " % (len(neu)))    
 
 
-        # TBD:  Currently we are looking at the last month experts
-        #       It seems we should include a bigger period
-
-        print("\r\n\r\nDomain experts that have been active on the main site one month prior the announcement\r\n")
+        print("\r\n\r\nDomain experts that have been active on the main site %s prior the announcement\r\n" % ("one month" if months == 1 else "%d months" % (months)))
         print_domain_experts_reach(
             active_meta, 
             active_users, 
@@ -541,6 +1286,22 @@ class QuestionFeedback:
         
 ###############################################################################
 
+def _pairs(questions, users):
+    return pd.DataFrame({"QuestionId": np.asarray(questions), "UserId": np.asarray(users)}).dropna().astype("int64")
+
+def _number_anonymous(columns):
+    # Rows without a user (e.g. answers of deleted accounts) get distinct ids below -1,
+    # -1 being the fill of comments: the per-question sets of question_user_info
+    # counted every such row as a user of its own
+    result, next_id = list(), -2
+    for column in columns:
+        values = np.asarray(column, dtype=float).copy()
+        missing = np.isnan(values)
+        values[missing] = next_id - np.arange(missing.sum())
+        next_id -= missing.sum()
+        result.append(values)
+    return result
+
 class SeriesFeedback:
     def __init__(self, data):
         self.data = data
@@ -554,6 +1315,8 @@ class SeriesFeedback:
             (data.users["Id"].isin(self.comment_votes["UserId"].unique()))|
             (data.users["Id"].isin(self.post_votes["UserId"].unique()))
         ]
+        self._question_metrics = None
+        self._participants = None
 
     def basic_stats(self):
         print("Unique users participated in the series")
@@ -623,6 +1386,9 @@ class SeriesFeedback:
         
     # https://docs.bokeh.org/en/latest/docs/user_guide/categorical.html#nested-categories
     def question_info(self):
+        from bokeh.models import ColumnDataSource, FactorRange
+        from bokeh.plotting import figure
+
         questions = self.posts[(self.posts["PostTypeId"] == 1) & (self.posts["UserTypeId"] == 5)].sort_values(by=["CreationDate"])
         serial_numbers = ["Q #%d" % index for index in range(1, len(questions.index) + 1)]
         metrics = ['Score', 'Interest']
@@ -645,12 +1411,14 @@ class SeriesFeedback:
         p.x_range.range_padding = 0.1
         p.xaxis.major_label_orientation = 1
         p.xgrid.grid_line_color = None
-        show(p)
+        report.show(p)
         for index, (_, row) in enumerate(questions.iterrows()):
             print("Q #%d https://meta.stackoverflow.com/q/%d | %s " % (index + 1, row['Id'], row["Title"]))
 
 
     def question_info_sep(self):
+        from bokeh.plotting import figure
+
         def _plot_metric(data, column_name, title):
             questions = data.posts[(data.posts["PostTypeId"] == 1) & (data.posts["UserTypeId"] == 5)].sort_values(by=["CreationDate"])
 
@@ -661,7 +1429,7 @@ class SeriesFeedback:
                       title=title)
             p.vbar(x=serial_numbers, top=questions[column_name].values, width=0.9)
             p.xgrid.grid_line_color = None
-            show(p)
+            report.show(p)
 
         _plot_metric(self, "Score", "Score Of The Questions")
         _plot_metric(self, "TotalQuestionActionCount", "Interest (Answers, Comments, Votes)")
@@ -669,24 +1437,20 @@ class SeriesFeedback:
 
     # https://docs.bokeh.org/en/latest/docs/user_guide/categorical.html#nested-categories
     def question_user_info(self):
+        from bokeh.models import ColumnDataSource, FactorRange
+        from bokeh.plotting import figure
+
         questions = self.posts[(self.posts["PostTypeId"] == 1) & (self.posts["UserTypeId"] == 5)].sort_values(by=["CreationDate"])
         question_ids = questions["Id"].values.tolist()
         serial_numbers = ["Q #%d" % index for index in range(1, len(questions.index) + 1)]
 
         metrics = ['Content', 'Votes']
-        alls = list()
-        contents = list()
-        voters = list()
-        for question_id in question_ids:
-            all, content, votes = self._question_users(question_id)                       
-            alls.append(len(set(all)))
-            contents.append(len(set(content))) 
-            voters.append(len(set(votes))) 
+        question_metrics = self.question_metrics().loc[question_ids]
 
         col_data = {
             'SerialNumbers': serial_numbers,
-            'Content': contents,
-            'Votes': voters
+            'Content': question_metrics["ContentUsers"].tolist(),
+            'Votes': question_metrics["Voters"].tolist()
         }
 
         x = [ (number, metric) for number in serial_numbers for metric in metrics]
@@ -700,24 +1464,19 @@ class SeriesFeedback:
         p.x_range.range_padding = 0.1
         p.xaxis.major_label_orientation = 1
         p.xgrid.grid_line_color = None
-        show(p)
+        report.show(p)
 
     # https://docs.bokeh.org/en/latest/docs/user_guide/categorical.html#nested-categories
     def question_percent_of_content_per_downvote(self):
+        from bokeh.plotting import figure
+
         questions = self.posts[(self.posts["PostTypeId"] == 1) & (self.posts["UserTypeId"] == 5)].sort_values(by=["CreationDate"])
         question_ids = questions["Id"].values.tolist()
         serial_numbers = ["Q #%d" % index for index in range(1, len(questions.index) + 1)]
 
-        percents = list()
-        downvoter_num = list()
-
-        for question_id in question_ids:
-            _, content, _ = self._question_users(question_id)                       
-            content_user_ids = set(content)
-            downvoters = self.post_votes[(self.post_votes['PostId'] == question_id) & (self.post_votes['VoteTypeId'] == 3)]["UserId"].unique()
-            downvoter_num.append(len(downvoters))
-            down_and_content = list(set(downvoters).intersection(content_user_ids))
-            percents.append( len(down_and_content) / float(len(downvoters)) * 100)
+        question_metrics = self.question_metrics().loc[question_ids]
+        percents = question_metrics["DownvotersWithContentPercent"].tolist()
+        downvoter_num = question_metrics["Downvoters"].tolist()
 
         p = figure(x_range=serial_numbers, 
                   height=report.PLOT_HEIGHT, 
@@ -726,31 +1485,26 @@ class SeriesFeedback:
         
         p.vbar(x=serial_numbers, top=percents, width=0.9)
         p.xgrid.grid_line_color = None
-        show(p)
+        report.show(p)
         for index, value in enumerate(downvoter_num):
             print("Q #%d, %d downvotes" % (index + 1, value))
 
     # https://docs.bokeh.org/en/latest/docs/user_guide/categorical.html#nested-categories
     def question_downvoters_rep(self):
+        from bokeh.models import ColumnDataSource, FactorRange
+        from bokeh.plotting import figure
+
         questions = self.posts[(self.posts["PostTypeId"] == 1) & (self.posts["UserTypeId"] == 5)].sort_values(by=["CreationDate"])
         question_ids = questions["Id"].values.tolist()
         serial_numbers = ["Q #%d" % index for index in range(1, len(questions.index) + 1)]
 
         metrics = ['Mean', 'Median']
-        medians = list()
-        means = list()
-        for question_id in question_ids:
-            downvoters = self.post_votes[(self.post_votes['PostId'] == question_id) & (self.post_votes['VoteTypeId'] == 3)]["UserId"].unique()
-            downvoter_users = self.users[self.users["Id"].isin(downvoters)]
-            downvoter_users = downvoter_users[downvoter_users["Reputation"] < downvoter_users["Reputation"].quantile(0.95)]
-            rep = downvoter_users["Reputation"]
-            medians.append(rep.median())
-            means.append(rep.mean())
+        question_metrics = self.question_metrics().loc[question_ids]
 
         col_data = {
             'SerialNumbers': serial_numbers,
-            'Means': means,
-            'Medians': medians
+            'Means': question_metrics["DownvoterRepMean"].tolist(),
+            'Medians': question_metrics["DownvoterRepMedian"].tolist()
         }
 
         x = [ (number, metric) for number in serial_numbers for metric in metrics]
@@ -764,31 +1518,121 @@ class SeriesFeedback:
         p.x_range.range_padding = 0.1
         p.xaxis.major_label_orientation = 1
         p.xgrid.grid_line_color = None
-        show(p)
-
-    def new_users(self):
-        question_users = list()
-        for question_id in sorted(self.data.questions_in_the_series, reverse=False):
-            post_ids = self.data.posts[self.data.posts["ParentId"] == question_id]["Id"].values.tolist()
-            answer_givers = self.data.posts[self.data.posts["Id"].isin(post_ids)]["OwnerUserId"].values.tolist()
-            post_voters = self.data.post_votes[self.data.post_votes["PostId"].isin(post_ids + [question_id])]["UserId"].values.tolist()
-            comments = self.data.comments[self.data.comments["PostId"].isin(post_ids + [question_id])]
-            commenters = comments["UserId"].values.tolist()
-            comment_voters = self.data.comment_votes[self.data.comment_votes["PostCommentId"].isin(comments["Id"])]["UserId"].values.tolist()
-            all_users = answer_givers + commenters + post_voters + comment_voters
-            question_users.append((question_id, all_users))
-
-        questions = list()
-        new_values = list()
-        total_values = list()
-        all_past_users = set()
-        for (question, users) in question_users:
-            current_users = list(set(users) - all_past_users)
-            all_past_users = set(list(all_past_users) + current_users)
-
-            questions.append(question)
-            new_values.append(len(current_users))
-            total_values.append(len(set(users)))
+        report.show(p)
+
+    def _participation(self, keep_anonymous=False):
+        # Unique (QuestionId, UserId) pairs: answers and comments, votes on posts and comments.
+        # Rows without a user are dropped, or kept as one user each with keep_anonymous
+        post_question = pd.Series(
+            np.where(self.posts["PostTypeId"] == 1, self.posts["Id"], self.posts["ParentId"]),
+            index=self.posts["Id"].values
+        )
+        comment_question = pd.Series(self.comments["PostId"].map(post_question).values, index=self.comments["Id"].values)
+        answers = self.posts[self.posts["ParentId"].notna()]
+        users = [answers["OwnerUserId"], self.comments["UserId"], self.post_votes["UserId"], self.comment_votes["UserId"]]
+        if keep_anonymous:
+            users = _number_anonymous(users)
+
+        content = pd.concat([
+            _pairs(answers["ParentId"], users[0]),
+            _pairs(comment_question, users[1])
+        ]).drop_duplicates()
+        votes = pd.concat([
+            _pairs(self.post_votes["PostId"].map(post_question), users[2]),
+            _pairs(self.comment_votes["PostCommentId"].map(comment_question), users[3])
+        ]).drop_duplicates()
+        return content, votes
+
+    def participants(self):
+        # Unique (QuestionId, UserId) pairs of everyone who acted on a question of the series
+        if self._participants is None:
+            content, votes = self._participation()
+            self._participants = pd.concat([content, votes]).drop_duplicates(ignore_index=True)
+        return self._participants
+
+    def first_seen(self, order=None):
+        # UserId -> position in order of the first question the user acted on,
+        # order is any sequence of the series questions (by Id by default)
+        order = sorted(self.data.questions_in_the_series) if order is None else list(order)
+        participants = self.participants()
+        positions = participants["QuestionId"].map(pd.Series(np.arange(len(order)), index=order))
+        return positions.groupby(participants["UserId"]).min().dropna().astype(int)
+
+    def new_user_counts(self, order=None):
+        # Per question in order: Total participants, New - first seen on this question,
+        # Returning - acted on an earlier question of order
+        order = sorted(self.data.questions_in_the_series) if order is None else list(order)
+        result = pd.DataFrame(index=pd.Index(order, name="QuestionId"))
+        result["Total"] = self.participants().groupby(by="QuestionId").size().reindex(order, fill_value=0).values
+        result["New"] = self.first_seen(order).value_counts().reindex(range(len(order)), fill_value=0).values
+        result["Returning"] = result["Total"] - result["New"]
+        return result
+
+    def reach_by_tier(self, main_site, months=1):
+        # Engagement tiers on the main site in the months before each question of the series,
+        # all questions at once: one engagement() call and one groupby.
+        # Site* - users of the tier on the main site, the rest - those of them who acted on the question
+        questions = self.posts[self.posts["PostTypeId"] == 1].sort_values(by="Id")
+        question_ids = questions["Id"].values
+        engagement = main_site.engagement(questions["CreationDate"].values, months)
+
+        participants = self.participants().copy()
+        participants["Window"] = np.searchsorted(question_ids, participants["QuestionId"].values)
+        reached = engagement.index.isin(pd.MultiIndex.from_frame(participants[["Window", "UserId"]]))
+
+        names = {name: name.title().replace(" ", "") for name, _ in main_site.ENGAGEMENT_TIERS}
+        if months == 1:
+            site = main_site.monthly_tier_counts(questions["CreationDate"].values).rename(columns=names)
+        else:
+            site = main_site.tier_counts(engagement, len(question_ids)).rename(columns=names)
+        meta = main_site.tier_counts(engagement[reached], len(question_ids)).rename(columns=names)
+        result = pd.concat([site.add_prefix("Site"), meta], axis=1)
+        result.index = pd.Index(question_ids, name="QuestionId")
+        result.insert(0, "Participants", participants.groupby(by="QuestionId").size().reindex(question_ids, fill_value=0).values)
+        return result
+
+    def question_metrics(self):
+        # One row per question of the series:
+        #   Users, ContentUsers, Voters - unique users who acted on the question or its answers,
+        #                                 every action without a user counts as one more user
+        #   Downvoters - unique users who downvoted the question itself
+        #   DownvotersWithContentPercent - share of those who also answered or commented
+        #   DownvoterRepMean, DownvoterRepMedian - downvoters' reputation below the 95th percentile
+        if self._question_metrics is not None:
+            return self._question_metrics
+
+        question_ids = self.posts[self.posts["PostTypeId"] == 1]["Id"].unique()
+        content, votes = self._participation(keep_anonymous=True)
+        downvotes = self.post_votes[(self.post_votes["VoteTypeId"] == 3) & (self.post_votes["PostId"].isin(question_ids))]
+        downvoters = _pairs(downvotes["PostId"], downvotes["UserId"]).drop_duplicates()
+
+        result = pd.DataFrame(index=pd.Index(question_ids, name="QuestionId"))
+        result["Users"] = pd.concat([content, votes]).drop_duplicates().groupby(by="QuestionId")["UserId"].size()
+        result["ContentUsers"] = content.groupby(by="QuestionId")["UserId"].size()
+        result["Voters"] = votes.groupby(by="QuestionId")["UserId"].size()
+        result["Downvoters"] = downvoters.groupby(by="QuestionId")["UserId"].size()
+        result["DownvotersWithContent"] = downvoters.merge(content, on=["QuestionId", "UserId"]).groupby(by="QuestionId")["UserId"].size()
+        result = result.fillna(0).astype(int)
+        result["DownvotersWithContentPercent"] = result["DownvotersWithContent"] / result["Downvoters"].replace(0, np.nan) * 100
+
+        reputation = downvoters.merge(self.users[["Id", "Reputation"]], left_on="UserId", right_on="Id")
+        trim = reputation["QuestionId"].map(reputation.groupby(by="QuestionId")["Reputation"].quantile(0.95))
+        reputation = reputation[reputation["Reputation"] < trim]
+        reputation = reputation.groupby(by="QuestionId")["Reputation"].agg(["mean", "median"])
+        result["DownvoterRepMean"] = reputation["mean"]
+        result["DownvoterRepMedian"] = reputation["median"]
+
+        self._question_metrics = result
+        return result
+
+    def new_users(self, order=None):
+        from bokeh.models import ColumnDataSource, FactorRange
+        from bokeh.plotting import figure
+
+        counts = self.new_user_counts(order)
+        questions = counts.index.tolist()
+        new_values = counts["New"].tolist()
+        total_values = counts["Total"].tolist()
 
         serial_numbers = ["Q #%d" % index for index in range(1, len(questions) + 1)]
         metrics = ['Total', 'New']
@@ -814,45 +1658,4 @@ class SeriesFeedback:
         p.x_range.range_padding = 0.1
         p.xaxis.major_label_orientation = 1
         p.xgrid.grid_line_color = None
-        show(p)
-
-    def _comment_voters(self, comment_id):
-        return self.comment_votes[self.comment_votes["PostCommentId"] == comment_id]["UserId"].values.tolist()
-    
-    def _post_voters(self, post_id):
-        return self.post_votes[self.post_votes['PostId'] == post_id]["UserId"].values.tolist()
-
-    def _commentators(self, post_id):
-        return self.comments[self.comments["PostId"] == post_id]["UserId"].values.tolist()
-
-    def _answer_givers(self, question_id):
-        return self.posts[self.posts["ParentId"] == question_id]["OwnerUserId"].values.tolist()
-
-    # return: all, content, voters
-    def _question_users(self, question_id):
-        answer_givers = self._answer_givers(question_id)
-        question_commentators = self._commentators(question_id)
-        question_voters = self._post_voters(question_id)
-        # TBD: question comment voters
-        question_comment_voters = list()
-        comment_ids = self.comments[self.comments["PostId"] == question_id]["Id"].unique()
-        for comment_id in comment_ids:
-            question_comment_voters.extend(self._comment_voters(comment_id))
-
-        answer_ids = self.posts[self.posts["ParentId"] == question_id]["Id"].unique()
-        answer_comentators = list()
-        answer_voters = list()
-        answer_comment_voters = list()
-
-        for answer_id in answer_ids:
-            answer_comentators.extend(self._commentators(answer_id))
-            answer_voters.extend(self._post_voters(answer_id))
-            comment_ids = self.comments[self.comments["PostId"] == answer_id]["Id"].unique()
-            for comment_id in comment_ids:
-                answer_comment_voters.extend(self._comment_voters(comment_id))
-
-        content = answer_givers + question_commentators + answer_comentators
-        voters = question_voters + question_comment_voters + answer_voters + answer_comment_voters
-        all = content + voters
-
-        return all, content, voters
+        report.show(p)
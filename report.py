@@ -9,23 +9,15 @@ import numpy as np
 
 from pandas.api.types import is_datetime64_any_dtype as is_datetime
 
+import json
 import datetime
+import gzip
 import base64
-import matplotlib.pyplot as plt
-from IPython.display import HTML    
-
-from bokeh.palettes import Spectral10, brewer, Set3_12
-from bokeh.models import ColumnDataSource, LabelSet
-from bokeh.models.tools import HoverTool
-from bokeh.plotting import figure, show
-from bokeh.layouts import widgetbox
-from bokeh.models import FixedTicker
-from bokeh.models.widgets import DataTable, DateFormatter, TableColumn
-import bokeh.io
-bokeh.io.output_notebook()
-
-from bokeh.palettes import Dark2_5 as palette
 import itertools 
+from concurrent.futures import ProcessPoolExecutor
+
+# matplotlib, bokeh and IPython are imported by the functions that use them,
+# so the module stays cheap to import in headless jobs.
 
 FIG_SIZE = (17, 8)
 PLOT_HEIGHT = 550
@@ -34,8 +26,156 @@ FONTSIZE = 14
 
 #@title Helper functions
 
+NOTEBOOK_INITIALIZED = False
+def init_notebook():
+    global NOTEBOOK_INITIALIZED
+    import bokeh.io
+    bokeh.io.output_notebook()
+    NOTEBOOK_INITIALIZED = True
+
+# "notebook": figures are shown inline
+# "files": figures are written to OUTPUT_FOLDER as OUTPUT_FORMATS (html, json, png)
+#          and the paths are collected in ARTIFACTS
+OUTPUT_MODE = "notebook"
+OUTPUT_FOLDER = None
+OUTPUT_FORMATS = ("html",)
+OUTPUT_PREFIX = "chart"
+ARTIFACTS = list()
+def set_output(mode="notebook", folder=None, formats=("html",), prefix="chart"):
+    global OUTPUT_MODE, OUTPUT_FOLDER, OUTPUT_FORMATS, OUTPUT_PREFIX, ARTIFACTS
+    if mode not in ("notebook", "files"):
+        raise ValueError("Unknown output mode %s" % mode)
+    if mode == "files" and folder is None:
+        raise ValueError("The files output mode needs a folder")
+    OUTPUT_MODE = mode
+    OUTPUT_FOLDER = folder
+    OUTPUT_FORMATS = tuple(formats)
+    OUTPUT_PREFIX = prefix
+    ARTIFACTS = list()
+
+def _artifact_base():
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    return os.path.join(OUTPUT_FOLDER, "%s_%02d" % (OUTPUT_PREFIX, len(ARTIFACTS) + 1))
+
+def save_figure(p):
+    from bokeh.embed import file_html, json_item
+    from bokeh.resources import CDN
+
+    base = _artifact_base()
+    paths = list()
+    for fmt in OUTPUT_FORMATS:
+        path = "%s.%s" % (base, fmt)
+        if fmt == "html":
+            with open(path, "w") as f:
+                f.write(file_html(p, CDN, OUTPUT_PREFIX))
+        elif fmt == "json":
+            with open(path, "w") as f:
+                json.dump(json_item(p), f)
+        elif fmt == "png":
+            # needs selenium and a browser driver
+            from bokeh.io import export_png
+            export_png(p, filename=path)
+        else:
+            raise ValueError("Unknown output format %s" % fmt)
+        paths.append(path)
+    ARTIFACTS.append(paths)
+    return paths
+
+def show(p):
+    if OUTPUT_MODE == "files":
+        save_figure(p)
+        return
+    if not NOTEBOOK_INITIALIZED:
+        init_notebook()
+    import bokeh.io
+    bokeh.io.show(p)
+
+def display(obj):
+    if OUTPUT_MODE == "files":
+        return
+    from IPython.display import display as ipython_display
+    ipython_display(obj)
+
+def _render_job(job):
+    name, function, args, folder, formats = job
+    set_output("files", folder, formats, name)
+    function(*args)
+    return name, ARTIFACTS
+
+def render_batch(jobs, folder, formats=("html",), max_workers=None):
+    # jobs: {name: (function, args)}, e.g. {"votes": (plot_df, (df, "Votes", "Date", "Votes"))}
+    # Every job renders in its own process, the result is {name: [[paths of a figure], ...]}.
+    # function and args are pickled for every job: use module-level functions
+    # taking frames, a bound method such as SeriesFeedback.question_info would
+    # ship its whole MetaData (all frames and the spreadsheet client) each time.
+    tasks = [(name, function, args, folder, tuple(formats)) for name, (function, args) in jobs.items()]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(_render_job, tasks))
+
+# Frames up to INLINE_EXPORT_LIMIT bytes (in memory) are embedded into the
+# notebook, bigger ones are streamed to EXPORT_FOLDER and linked.
+INLINE_EXPORT_LIMIT = 1024 * 1024
+EXPORT_FOLDER = "exports"
+EXPORT_CHUNK_ROWS = 100000
+EXPORTED_FILES = list()
+
+def export_frame(df, filename, fmt="csv.gz", folder=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Writes the frame chunk by chunk, so only one chunk is serialized at a time.
+    # fmt: "csv.gz" or "parquet"
+    folder = EXPORT_FOLDER if folder is None else folder
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "%s.%s" % (filename, fmt))
+    if fmt == "csv.gz":
+        with gzip.open(path, "wt", newline="") as f:
+            for start in range(0, max(len(df.index), 1), chunk_rows):
+                df.iloc[start:start + chunk_rows].to_csv(f, header=(start == 0))
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # One schema for the whole frame: a chunk of an object column may be
+        # all None or hold only ints, its own inferred type would not match
+        schema = pa.Schema.from_pandas(df)
+        writer = pq.ParquetWriter(path, schema, compression="snappy")
+        try:
+            for start in range(0, max(len(df.index), 1), chunk_rows):
+                writer.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema))
+        finally:
+            writer.close()
+    else:
+        raise ValueError("Unknown export format %s" % fmt)
+    return path
+
+EXPORT_TITLES = {"csv.gz": "Download gzipped CSV file", "parquet": "Download Parquet file"}
+
 # https://stackoverflow.com/a/42907645/564240
-def create_download_link(df, title = "Download CSV file", filename = "data.csv"):
+def create_download_link(df, title = None, filename = "data.csv", fmt="csv.gz"):
+    # title: the link text, by default it names the format the file ends up in
+    from IPython.display import HTML
+    if df.memory_usage(index=True, deep=True).sum() > INLINE_EXPORT_LIMIT:
+        name = "%s_%03d" % (os.path.splitext(filename)[0], len(EXPORTED_FILES) + 1)
+        path = export_frame(df, name, fmt)
+        EXPORTED_FILES.append(path)
+        title = EXPORT_TITLES[fmt] if title is None else title
+        if "colab" in DEFINE:
+            # Colab does not serve the kernel's files by relative links: the link
+            # calls back into the kernel, which sends the file to the browser.
+            # Nothing is downloaded until the link is clicked.
+            from google.colab import output
+            callback = "download_export_%d" % (len(EXPORTED_FILES))
+
+            def _download(path=path):
+                from google.colab import files
+                files.download(path)
+
+            output.register_callback(callback, _download)
+            html = '<a href="#" onclick="google.colab.kernel.invokeFunction(\'{callback}\', [], {{}}); return false;">{title}</a>'
+            html = html.format(callback=callback, title=title)
+            return HTML(html)
+        html = '<a download="{filename}" href="{path}" target="_blank">{title}</a>'
+        html = html.format(path=path, title=title, filename=os.path.basename(path))
+        return HTML(html)
+
+    title = "Download CSV file" if title is None else title
     csv = df.to_csv()
     b64 = base64.b64encode(csv.encode())
     payload = b64.decode()
@@ -50,7 +190,11 @@ def init(defs):
 
 def tabbar(params):
     global DEFINE
-    if "colab" in DEFINE:
+    if OUTPUT_MODE == "files":
+        for key in params.keys():
+            f, f_args = params[key]
+            f(*f_args)
+    elif "colab" in DEFINE:
         from google.colab import widgets    
         tb = widgets.TabBar(list(params.keys()))
         for index, key in enumerate(params.keys()):
@@ -71,6 +215,7 @@ def tabbar(params):
 
 
 def plot_matplotlib_(df, title, xlabel, ylabel, stacked):
+    import matplotlib.pyplot as plt
     alpha = 0.5
     if stacked:
         df.plot(kind='area', stacked=True, figsize=FIG_SIZE, alpha=alpha)
@@ -80,10 +225,77 @@ def plot_matplotlib_(df, title, xlabel, ylabel, stacked):
     plt.xlabel(xlabel, fontsize=FONTSIZE)
     plt.ylabel(ylabel, fontsize=FONTSIZE)
     plt.title(title, fontsize=FONTSIZE+2)
-    plt.show()
+    if OUTPUT_MODE == "files":
+        path = "%s.png" % (_artifact_base())
+        plt.savefig(path)
+        plt.close()
+        ARTIFACTS.append([path])
+    else:
+        plt.show()
+
+# https://skemman.is/bitstream/1946/15343/3/SS_MSthesis.pdf
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: positions of n_out points that keep the shape of y(x)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.floor(np.linspace(1, n - 1, n_out - 1)).astype(int)
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = x[hi:edges[i + 2]].mean()
+            avg_y = y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        selected.append(a)
+    selected.append(n - 1)
+    return np.array(selected)
+
+def minmax_indices(x, y, n_out):
+    # The lowest and the highest point of every one of n_out / 2 buckets
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(int)
+    selected = [0, n - 1]
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            selected.append(lo + int(y[lo:hi].argmin()))
+            selected.append(lo + int(y[lo:hi].argmax()))
+    return np.unique(selected)
+
+# None, "lttb" or "minmax"; the target is about one point per pixel of PLOT_WIDTH
+DOWNSAMPLE = None
+def downsample_(df, stacked, method):
+    # Returns a subset of the rows of df, so tooltips keep showing real values.
+    # Rows are picked per column (per stack level for stacked plots) and united.
+    if method is None or len(df.index) <= PLOT_WIDTH or not df.index.is_monotonic_increasing:
+        return df
+    if is_datetime(df.index):
+        x = df.index.asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(df.index):
+        x = df.index.values.astype(float)
+    else:
+        return df
+
+    pick = {"lttb": lttb_indices, "minmax": minmax_indices}[method]
+    values = df.select_dtypes(include=[np.number]).fillna(0).values.astype(float)
+    if stacked:
+        values = values.cumsum(axis=1)
+    rows = np.unique(np.concatenate([pick(x, values[:, index], PLOT_WIDTH) for index in range(values.shape[1])] + [np.array([0], dtype=int)]))
+    return df.iloc[rows]
 
-def plot_bokeh_(df, title, xlabel, ylabel, stacked, need_table, location="top_left"):
-    tmp = df.reset_index() #.fillna(0)
+def plot_bokeh_(df, title, xlabel, ylabel, stacked, need_table, location="top_left", downsample=None):
+    from bokeh.palettes import Spectral10, brewer, Set3_12
+    from bokeh.models import ColumnDataSource
+    from bokeh.models.tools import HoverTool
+    from bokeh.plotting import figure
+
+    tmp = downsample_(df, stacked, DOWNSAMPLE if downsample is None else downsample).reset_index() #.fillna(0)
     source = ColumnDataSource(tmp)
     # TBD: add a check of the type of the index
     if is_datetime(df.index):
@@ -141,15 +353,35 @@ def plot_bokeh_(df, title, xlabel, ylabel, stacked, need_table, location="top_le
         print_table(df)
 
 PLOT_MATPLOTLIB=False
-def plot_df(df, title, xlabel, ylabel, stacked=False, need_table=True, location="top_left"):
+def plot_df(df, title, xlabel, ylabel, stacked=False, need_table=True, location="top_left", downsample=None):
     if PLOT_MATPLOTLIB:
         plot_matplotlib_(df, title, xlabel, ylabel, stacked)
     else:
-        plot_bokeh_(df, title, xlabel, ylabel, stacked, need_table, location)   
+        plot_bokeh_(df, title, xlabel, ylabel, stacked, need_table, location, downsample)   
+
+def referenced_fields_(tooltips):
+    # "@Score", "@{Display Name}{0.00}" -> Score, Display Name
+    if isinstance(tooltips, str):
+        tooltips = [("", tooltips)]
+    fields = list()
+    for _, value in tooltips:
+        for braced, plain in re.findall(r'@\{([^}]+)\}|@(\w+)', value):
+            fields.append(braced or plain)
+    return fields
 
+# Above this number of points the scatter plot is drawn with WebGL
+WEBGL_THRESHOLD = 5000
 def scatter_plot(data_to_display, title, xlabel, ylabel, hover_tooltips, x, y, text):
+    from bokeh.models import ColumnDataSource, LabelSet
+    from bokeh.models.tools import HoverTool
+    from bokeh.plotting import figure
+
+    # Only the columns the glyphs, labels and tooltips refer to go to the browser
+    fields = [x, y, text, "Size"] + referenced_fields_(hover_tooltips)
+
     def scatter_plot_helper(p, df, x, y, marker, fill_color, text):
-        source = ColumnDataSource(df)
+        columns = [column for column in df.columns if column in fields]
+        source = ColumnDataSource(df[columns])
         p.scatter(
             x=x, y=y, marker=marker, source=source,
             line_color=fill_color, fill_color=fill_color, fill_alpha=0.5, size="Size")
@@ -162,7 +394,9 @@ def scatter_plot(data_to_display, title, xlabel, ylabel, hover_tooltips, x, y, t
                 x_offset=7, y_offset=7, 
                 source=source, render_mode='canvas')
         )
-    p = figure(plot_height=PLOT_HEIGHT, plot_width=PLOT_WIDTH)
+    points = sum(len(data_.index) for (data_, _, _) in data_to_display)
+    output_backend = "webgl" if points > WEBGL_THRESHOLD else "canvas"
+    p = figure(plot_height=PLOT_HEIGHT, plot_width=PLOT_WIDTH, output_backend=output_backend)
     p.add_tools(HoverTool(tooltips=hover_tooltips))
 
     for (data_, figure_, color_) in data_to_display:
@@ -177,12 +411,15 @@ def scatter_plot(data_to_display, title, xlabel, ylabel, hover_tooltips, x, y, t
     show(p)
 
 
-def print_table(df):
-    tmp = df.reset_index()
+def data_table_(tmp, index_name, sortable=True):
+    from bokeh.models import ColumnDataSource
+    from bokeh.layouts import widgetbox
+    from bokeh.models.widgets import DataTable, DateFormatter, TableColumn
+
     source = ColumnDataSource(tmp)
     columns = list()
     for index, column in enumerate(list(tmp.columns.values)):
-        if column == df.index.name: 
+        if column == index_name: 
             columns.append(
                 TableColumn(field=column, title=column, formatter=DateFormatter())
             ) 
@@ -191,11 +428,85 @@ def print_table(df):
                 TableColumn(field=column, title=column)
             )
 
-    data_table = DataTable(source=source, columns=columns, width=PLOT_WIDTH, height=PLOT_HEIGHT)
-    show(widgetbox(data_table))
-    display(create_download_link(tmp))
+    data_table = DataTable(source=source, columns=columns, width=PLOT_WIDTH, height=PLOT_HEIGHT, sortable=sortable)
+    return widgetbox(data_table)
+
+def sort_order_(column, ascending=True):
+    # Row positions of a stable sort, missing values go last either way.
+    # rank() also copes with object columns holding NaN, argsort() does not.
+    ranks = column.rank(method="first", ascending=ascending, na_option="bottom")
+    return np.argsort(ranks.values, kind="stable")
+
+def paged_table_(tmp, index_name, page_size):
+    # Only the current page is sent to the browser. Paging and sorting slice
+    # the frame here, the sort order is computed once per column.
+    import ipywidgets as widgets
+
+    pages = max(1, (len(tmp.index) + page_size - 1) // page_size)
+    state = {"page": 0, "sort": None, "ascending": True}
+    orders = dict()
+
+    previous_button = widgets.Button(description="Previous")
+    next_button = widgets.Button(description="Next")
+    sort_by = widgets.Dropdown(options=[("", None)] + [(str(column), column) for column in tmp.columns], description="Sort by")
+    ascending = widgets.Checkbox(value=True, description="Ascending")
+    label = widgets.Label()
+    output = widgets.Output()
+
+    def _page():
+        start = state["page"] * page_size
+        if state["sort"] is None:
+            return tmp.iloc[start:start + page_size]
+        key = (state["sort"], state["ascending"])
+        if key not in orders:
+            orders[key] = sort_order_(tmp[state["sort"]], state["ascending"])
+        return tmp.iloc[orders[key][start:start + page_size]]
+
+    def _render(*args):
+        label.value = "Page %d of %d (%d rows)" % (state["page"] + 1, pages, len(tmp.index))
+        output.clear_output(wait=True)
+        with output:
+            show(data_table_(_page().reset_index(drop=True), index_name, sortable=False))
+
+    def _move(step):
+        def _handler(button):
+            state["page"] = min(max(state["page"] + step, 0), pages - 1)
+            _render()
+        return _handler
+
+    def _sort(change):
+        state["sort"] = sort_by.value
+        state["ascending"] = ascending.value
+        state["page"] = 0
+        _render()
+
+    previous_button.on_click(_move(-1))
+    next_button.on_click(_move(1))
+    sort_by.observe(_sort, names="value")
+    ascending.observe(_sort, names="value")
+
+    display(widgets.VBox([widgets.HBox([previous_button, next_button, label, sort_by, ascending]), output]))
+    _render()
+
+# Frames longer than TABLE_PAGE_SIZE rows are shown page by page
+TABLE_PAGE_SIZE = 1000
+def print_table(df, page_size=None):
+    page_size = TABLE_PAGE_SIZE if page_size is None else page_size
+    tmp = df.reset_index()
+    if len(tmp.index) <= page_size:
+        show(data_table_(tmp, df.index.name))
+    elif OUTPUT_MODE == "files":
+        show(data_table_(tmp.iloc[:page_size], df.index.name))
+    else:
+        paged_table_(tmp, df.index.name, page_size)
+
+    if OUTPUT_MODE == "notebook":
+        display(create_download_link(tmp))
 
 def t_stacked_bars(df, stack_params, title, width, location="top_left", orientation="horizontal"):
+    from bokeh.palettes import brewer
+    from bokeh.plotting import figure
+
     colors = ["#718dbf", "#e84d60"]
     if len(stack_params) > 2:
         colors = brewer['Spectral'][len(stack_params)]
@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The notebooks import the root modules and product/ modules by name
+for folder in [ROOT, os.path.join(ROOT, "product"), os.path.join(ROOT, "tests")]:
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
@@ -0,0 +1,141 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class FakeWorksheet:
+    def __init__(self, title, values):
+        self.title = title
+        self.values = values
+
+
+class FakeSpreadsheet:
+    # The gspread surface SpreadsheetData uses; counts requests and how many overlap
+    def __init__(self, sheets, revision="rev-1", delay=0.0):
+        self.sheets = sheets
+        self.lastUpdateTime = revision
+        self.delay = delay
+        self.calls = list()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def worksheets(self):
+        self.calls.append("worksheets")
+        return self.sheets
+
+    def values_batch_get(self, ranges):
+        with self._lock:
+            self.calls.append(("values_batch_get", len(ranges)))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        by_range = {"'%s'" % (sheet.title.replace("'", "''")): sheet for sheet in self.sheets}
+        # Like the API: trailing empty cells are trimmed
+        return {"valueRanges": [
+            {"range": r, "values": [_trim(row) for row in by_range[r].values]} for r in ranges
+        ]}
+
+    def batch_calls(self):
+        return [call for call in self.calls if call != "worksheets"]
+
+
+class FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_key(self, key):
+        return self.spreadsheet
+
+
+def _trim(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+def feedback_client(answers_by_question, revision="rev-1", delay=0.0):
+    # One worksheet per question with a Link / Theme / Mood row per answer
+    sheets = [FakeWorksheet("Summary", [["Question", "Notes"]])]
+    moods = ["positive", "negative", "neutral"]
+    for question_id, answer_ids in answers_by_question.items():
+        rows = [["Link", "Theme", "Mood"]]
+        for index, answer_id in enumerate(answer_ids):
+            theme = "theme %d" % (index % 3) if index % 4 else ""
+            rows.append(["https://meta.stackoverflow.com/a/%d/123" % (answer_id), theme, moods[index % 3]])
+        title = "https://meta.stackoverflow.com/questions/%d/announcement" % (question_id)
+        sheets.append(FakeWorksheet(title, rows))
+    return FakeClient(FakeSpreadsheet(sheets, revision=revision, delay=delay))
+
+
+def meta_dump(questions=6, answers_per_question=8, users=300, seed=0):
+    # Frames shaped like the meta site CSV dumps MetaData reads
+    rng = np.random.default_rng(seed)
+    question_ids = np.arange(1, questions + 1)
+    answer_parents = np.repeat(question_ids, answers_per_question)
+    post_ids = np.concatenate([question_ids, 1000 + np.arange(len(answer_parents))])
+    posts = pd.DataFrame({
+        "Id": post_ids,
+        "PostTypeId": [1] * questions + [2] * len(answer_parents),
+        "ParentId": np.concatenate([np.full(questions, np.nan), answer_parents]),
+        "OwnerUserId": rng.integers(1, users, len(post_ids)).astype(float),
+        "Score": rng.integers(-10, 40, len(post_ids)),
+        "ViewCount": rng.integers(0, 5000, len(post_ids)),
+        "Title": "title",
+        "Body": "body",
+        "CreationDate": (pd.Timestamp("2022-01-01") + pd.to_timedelta(np.arange(len(post_ids)), unit="h")).strftime("%Y-%m-%d %H:%M:%S"),
+        "DeletionDate": ""
+    })
+    posts.loc[posts.index[-1], "OwnerUserId"] = np.nan
+
+    def _events(n, parent_field, parents, offset):
+        return pd.DataFrame({
+            "Id": offset + np.arange(n),
+            parent_field: rng.choice(parents, n),
+            "UserId": rng.integers(1, users, n),
+            "CreationDate": (pd.Timestamp("2022-02-01") + pd.to_timedelta(np.arange(n), unit="min")).strftime("%Y-%m-%d %H:%M:%S"),
+            "DeletionDate": ""
+        })
+
+    post_votes = _events(len(post_ids) * 10, "PostId", post_ids, 0)
+    post_votes["VoteTypeId"] = rng.choice([2, 3, 5], len(post_votes.index))
+    post_votes["TargetUserId"] = np.where(rng.random(len(post_votes.index)) < 0.1, np.nan, 7)
+    comments = _events(len(post_ids) * 3, "PostId", post_ids, 0)
+    comments["Score"] = np.where(rng.random(len(comments.index)) < 0.5, np.nan, 1)
+    comment_votes = _events(len(comments.index) * 2, "PostCommentId", comments["Id"].values, 0)
+
+    account_ids = np.arange(1, users + 1) + 10
+    return {
+        "users": pd.DataFrame({
+            "Id": np.arange(1, users + 1),
+            "AccountId": account_ids,
+            "UserTypeId": 1,
+            "Reputation": rng.integers(1, 50000, users),
+            "CreationDate": "2020-01-01 00:00:00",
+            "DisplayName": ["user %d" % (index) for index in range(users)]
+        }),
+        "posts": posts,
+        "post_votes": post_votes,
+        "comments": comments,
+        "comment_votes": comment_votes,
+        "moderators": pd.DataFrame({"AccountId": account_ids[:5]}),
+        "employees": pd.DataFrame({"AccountId": account_ids[5:10]})
+    }
+
+
+def write_meta_dump(folder, frames):
+    import feedback_processing
+
+    folder.mkdir(parents=True, exist_ok=True)
+    for name, file_name in feedback_processing.MetaData.CSV_FILES.items():
+        frames[name].to_csv(folder / file_name, index=False)
+
+
+def answers_by_question(frames):
+    answers = frames["posts"][frames["posts"]["PostTypeId"] == 2]
+    return {int(question_id): group["Id"].tolist() for question_id, group in answers.groupby("ParentId")}
@@ -0,0 +1,89 @@
+import json
+
+import pandas as pd
+
+import feedback_processing as fp
+
+
+def _source(tmp_path, text="a,b\n1,2\n"):
+    path = tmp_path / "source.csv"
+    path.write_text(text)
+    return [str(path)]
+
+
+def test_load_or_build_reuses_the_snapshot(tmp_path):
+    cache = fp.FrameCache(str(tmp_path / "cache"))
+    sources = _source(tmp_path)
+    builds = list()
+
+    def _build():
+        builds.append(1)
+        return {"table": pd.read_csv(sources[0])}
+
+    first = cache.load_or_build("frames", sources, _build)
+    second = cache.load_or_build("frames", sources, _build)
+    assert len(builds) == 1
+    pd.testing.assert_frame_equal(first["table"], second["table"])
+
+
+def test_unwritable_frames_are_returned_uncached(tmp_path, capsys):
+    cache = fp.FrameCache(str(tmp_path / "cache"))
+    sources = _source(tmp_path)
+    mixed = pd.DataFrame({"Value": ["text", 1, 2.5]})
+
+    frames = cache.load_or_build("frames", sources, lambda: {"table": mixed})
+    assert frames["table"] is mixed
+    assert "frames is not cached" in capsys.readouterr().out
+    assert cache._read_manifest("frames") is None
+
+    frames = cache.load_or_update("state", sources, lambda: ({"table": mixed}, {"Id": 1}), None)
+    assert frames["table"] is mixed
+    assert "state is not cached" in capsys.readouterr().out
+
+
+def test_failed_write_drops_the_previous_snapshot(tmp_path, capsys):
+    cache = fp.FrameCache(str(tmp_path / "cache"))
+    sources = _source(tmp_path)
+    cache.load_or_build("frames", sources, lambda: {"table": pd.DataFrame({"Value": [1, 2]})})
+    assert json.loads((tmp_path / "cache" / "frames.json").read_text())["tables"]
+
+    sources = _source(tmp_path, "a,b\n1,2\n3,4\n")
+    mixed = pd.DataFrame({"Value": ["text", 1]})
+    assert cache.load_or_build("frames", sources, lambda: {"table": mixed})["table"] is mixed
+    assert cache._read_manifest("frames") is None
+
+
+def test_snapshots_of_another_version_are_rebuilt(tmp_path):
+    sources = _source(tmp_path)
+    builds = list()
+
+    def _build():
+        builds.append(1)
+        return {"table": pd.read_csv(sources[0])}
+
+    fp.FrameCache(str(tmp_path / "cache"), version=1).load_or_build("frames", sources, _build)
+    fp.FrameCache(str(tmp_path / "cache"), version=1).load_or_build("frames", sources, _build)
+    assert len(builds) == 1
+    fp.FrameCache(str(tmp_path / "cache"), version=2).load_or_build("frames", sources, _build)
+    assert len(builds) == 2
+
+
+def test_state_of_another_version_is_not_updated(tmp_path):
+    sources = _source(tmp_path)
+    calls = list()
+
+    def _build():
+        calls.append("build")
+        return {"table": pd.read_csv(sources[0])}, {"Id": 1}
+
+    def _update(frames, marks):
+        calls.append("update")
+        return frames, marks
+
+    fp.FrameCache(str(tmp_path / "cache"), version=1).load_or_update("state", sources, _build, _update)
+    sources = _source(tmp_path, "a,b\n1,2\n3,4\n")
+    fp.FrameCache(str(tmp_path / "cache"), version=1).load_or_update("state", sources, _build, _update)
+    assert calls == ["build", "update"]
+    sources = _source(tmp_path, "a,b\n1,2\n3,4\n5,6\n")
+    fp.FrameCache(str(tmp_path / "cache"), version=2).load_or_update("state", sources, _build, _update)
+    assert calls == ["build", "update", "build"]
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import feedback_processing as fp
+
+
+ACTION_FIELDS = list(fp.MainSiteData.ENGAGEMENT_WEIGHTS.keys())
+
+
+def _write_actions(folder, nan_every=7, users=400, months=6, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2021-01-01", periods=months, freq="MS")
+    df = pd.DataFrame({
+        "OnDate": np.repeat(dates.strftime("%Y-%m-%d"), users),
+        "UserId": np.tile(np.arange(1, users + 1), months),
+        "AccountId": np.tile(np.arange(1, users + 1), months) + 10
+    })
+    for field in ACTION_FIELDS:
+        df[field] = rng.poisson(rng.choice([0.05, 0.5, 5, 40], len(df.index))).astype(float)
+    df.loc[::nan_every, "Reviews"] = np.nan
+    (folder / "so").mkdir()
+    df.to_csv(folder / "so" / "monthly_actions.csv", index=False)
+    return df
+
+
+def _baseline_tiers(df, end_date):
+    # What domain_experts computed before the tier engine
+    ts = pd.Timestamp(end_date)
+    dates = pd.to_datetime(df["OnDate"])
+    tmp = df[(dates > ts - pd.DateOffset(months=1)) & (dates < ts)]
+    points = tmp["Questions"] + tmp["Answers"] + 1/5. * tmp["Comments"] + 1/5. * tmp["Edits"] + 1/10. * (
+        tmp["AcceptVotes"] + tmp["UpVotes"] + tmp["DownVotes"] + tmp["CommentVotes"] +
+        tmp["CloseVotes"] + tmp["ReopenVotes"] + tmp["OtherFlags"] + tmp["Reviews"]
+    )
+    return [len(tmp.index), (points >= 1).sum(), (points >= 10).sum(), (points >= 100).sum()]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_nan_counters_do_not_raise_tiers(tmp_path, compact):
+    df = _write_actions(tmp_path)
+    site = fp.MainSiteData("so", str(tmp_path), use_cache=False, compact=compact)
+    end_dates = ["2021-02-15", "2021-04-02", "2021-06-20"]
+
+    from_rollup = site.monthly_tier_counts(end_dates)
+    from_engagement = site.tier_counts(site.engagement(end_dates, 1), len(end_dates))
+    pd.testing.assert_frame_equal(from_rollup, from_engagement, check_dtype=False, check_index_type=False)
+
+    for window, end_date in enumerate(end_dates):
+        assert from_rollup.iloc[window].tolist() == _baseline_tiers(df, end_date)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_rollup_user_tiers_treat_nan_as_zero(tmp_path, compact):
+    _write_actions(tmp_path, nan_every=1)
+    site = fp.MainSiteData("so", str(tmp_path), use_cache=False, compact=compact)
+    _, user_tiers = site.rollup()
+    assert site.actions["EngagementPoints"].isna().all()
+    assert (user_tiers["Tier"] == 0).all()
+
+
+TIER_NAMES = [name for name, _ in fp.MainSiteData.ENGAGEMENT_TIERS]
+# A question on a month start, whose (end - months; end) window holds months - 1 OnDates
+QUESTION_DATES = ["2021-04-01 00:00:00", "2021-05-17 10:00:00", "2021-06-01 00:00:00", "2021-03-15 08:00:00", "2021-07-02 00:00:00", "2021-02-01 00:00:00"]
+
+
+def _reference_tiers(site, end_date, months, user_ids=None):
+    # One window recomputed on its own: points summed per user over the window
+    # and averaged over the OnDates the window holds
+    actions = site.actions
+    dates = pd.Series(fp.MainSiteData._timestamps(actions["OnDate"]))
+    ts = pd.Timestamp(end_date)
+    window = ((dates > ts - pd.DateOffset(months=months)) & (dates < ts)).values
+    tmp = actions[window]
+    held = max(dates[window].nunique(), 1)
+    if user_ids is not None:
+        tmp = tmp[tmp["UserId"].isin(user_ids)]
+    points = tmp["EngagementPoints"].groupby(tmp["UserId"]).sum() / held
+    return [len(points.index)] + [int((points >= threshold).sum()) for _, threshold in fp.MainSiteData.ENGAGEMENT_TIERS[1:]]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("months", [1, 2, 3])
+def test_engagement_averages_over_the_months_in_the_window(tmp_path, compact, months):
+    _write_actions(tmp_path, nan_every=11, months=8)
+    site = fp.MainSiteData("so", str(tmp_path), use_cache=False, compact=compact)
+    counts = site.tier_counts(site.engagement(QUESTION_DATES, months), len(QUESTION_DATES))
+    for window, end_date in enumerate(QUESTION_DATES):
+        assert counts.iloc[window].tolist() == _reference_tiers(site, end_date, months)
+
+
+@pytest.fixture
+def series_sites(tmp_path):
+    import fakes
+
+    _write_actions(tmp_path, nan_every=11, users=300, months=8)
+    site = fp.MainSiteData("so", str(tmp_path), use_cache=False)
+
+    frames = fakes.meta_dump(questions=len(QUESTION_DATES), seed=2)
+    posts = frames["posts"]
+    posts.loc[posts["PostTypeId"] == 1, "CreationDate"] = QUESTION_DATES
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    by_question = fakes.answers_by_question(frames)
+    meta = fp.MetaData(
+        "sheet", "meta", sorted(by_question.keys()), str(tmp_path), use_cache=False,
+        spreadsheet_client=fakes.feedback_client(by_question)
+    )
+    return site, meta
+
+
+def _question_participants(meta, question_id):
+    posts = meta.posts[(meta.posts["Id"] == question_id) | (meta.posts["ParentId"] == question_id)]
+    answers = posts[posts["Id"] != question_id]
+    comments = meta.comments[meta.comments["PostId"].isin(posts["Id"])]
+    users = pd.concat([
+        answers["OwnerUserId"],
+        comments["UserId"],
+        meta.post_votes.loc[meta.post_votes["PostId"].isin(posts["Id"]), "UserId"],
+        meta.comment_votes.loc[meta.comment_votes["PostCommentId"].isin(comments["Id"]), "UserId"]
+    ])
+    return set(users.dropna().astype(int))
+
+
+@pytest.mark.parametrize("months", [1, 3])
+def test_reach_by_tier_matches_per_question_recomputation(series_sites, months):
+    site, meta = series_sites
+    result = fp.SeriesFeedback(meta).reach_by_tier(site, months)
+    columns = [name.title().replace(" ", "") for name in TIER_NAMES]
+
+    for question_id, end_date in zip(range(1, len(QUESTION_DATES) + 1), QUESTION_DATES):
+        participants = _question_participants(meta, question_id)
+        row = result.loc[question_id]
+        assert row["Participants"] == len(participants)
+        assert row[["Site" + column for column in columns]].tolist() == _reference_tiers(site, end_date, months)
+        assert row[columns].tolist() == _reference_tiers(site, end_date, months, participants)
+
+
+@pytest.mark.parametrize("months", [1, 3])
+def test_domain_experts_prints_the_window_tiers(series_sites, capsys, months):
+    site, meta = series_sites
+    for question_id, end_date in zip(range(1, len(QUESTION_DATES) + 1), QUESTION_DATES):
+        fp.QuestionFeedback(site, meta, question_id).domain_experts(1, months)
+        lines = capsys.readouterr().out.splitlines()
+        expected = _reference_tiers(site, end_date, months)
+        for name, count in zip(TIER_NAMES, expected):
+            assert any(line.startswith("- %s: %d" % (name, count)) for line in lines), name
+        expected = _reference_tiers(site, end_date, months, _question_participants(meta, question_id))
+        for name, count in zip(TIER_NAMES, expected):
+            assert " - %s: %d" % (name, count) in lines
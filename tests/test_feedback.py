@@ -0,0 +1,93 @@
+import pandas as pd
+import pytest
+
+import fakes
+import feedback_processing as fp
+
+
+def _meta(tmp_path, client, workers=4, use_cache=False, **kwargs):
+    frames = fakes.meta_dump(**kwargs)
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    questions = sorted(fakes.answers_by_question(frames).keys())
+    return frames, fp.MetaData(
+        "sheet", "meta", questions, str(tmp_path), use_cache=use_cache,
+        feedback_workers=workers, spreadsheet_client=client
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 3, 16])
+def test_prefetch_uses_a_bounded_pool(tmp_path, workers):
+    frames = fakes.meta_dump(questions=7)
+    client = fakes.feedback_client(fakes.answers_by_question(frames), delay=0.05)
+    _meta(tmp_path, client, workers=workers, questions=7)
+
+    spreadsheet = client.spreadsheet
+    batches = spreadsheet.batch_calls()
+    assert spreadsheet.calls.count("worksheets") == 1
+    assert len(batches) == min(workers, 7)
+    assert sum(size for _, size in batches) == 7
+    assert spreadsheet.max_active <= workers
+
+
+def test_feedback_ids_and_timings(tmp_path):
+    frames = fakes.meta_dump()
+    by_question = fakes.answers_by_question(frames)
+    client = fakes.feedback_client(by_question)
+    _, meta = _meta(tmp_path, client)
+
+    for question_id, answer_ids in by_question.items():
+        feedback = meta.feedback[meta.feedback["QuestionId"] == question_id]
+        assert feedback["AnswerId"].tolist() == answer_ids
+    assert meta.feedback["AnswerId"].dtype.kind == "i"
+    assert (meta.feedback["Theme"] != "").all()
+    assert len(meta.all_feedback.index) == sum(len(ids) for ids in by_question.values())
+
+    timings = meta.feedback_timings
+    assert timings.columns.tolist() == ["Rows", "FetchSeconds", "ParseSeconds"]
+    assert timings.index.tolist() == sorted(by_question.keys())
+    assert timings["Rows"].tolist() == [len(by_question[id]) for id in sorted(by_question.keys())]
+    assert (timings[["FetchSeconds", "ParseSeconds"]] >= 0).all().all()
+
+
+def test_questions_without_a_sheet_are_skipped(tmp_path):
+    frames = fakes.meta_dump()
+    by_question = fakes.answers_by_question(frames)
+    client = fakes.feedback_client({id: by_question[id] for id in list(by_question)[:2]})
+    _, meta = _meta(tmp_path, client)
+
+    assert sorted(meta.feedback["QuestionId"].unique()) == list(by_question)[:2]
+    assert sum(size for _, size in client.spreadsheet.batch_calls()) == 2
+
+
+def test_warm_run_reads_the_snapshot(tmp_path):
+    frames = fakes.meta_dump()
+    by_question = fakes.answers_by_question(frames)
+    cold_client = fakes.feedback_client(by_question)
+    _, cold = _meta(tmp_path, cold_client, use_cache=True)
+    assert len(cold_client.spreadsheet.batch_calls()) > 0
+
+    warm_client = fakes.feedback_client(by_question)
+    _, warm = _meta(tmp_path, warm_client, use_cache=True)
+    assert warm_client.spreadsheet.calls == []
+    pd.testing.assert_frame_equal(warm.feedback, cold.feedback)
+
+    # A new revision of the spreadsheet is pulled again
+    edited_client = fakes.feedback_client(by_question, revision="rev-2")
+    _meta(tmp_path, edited_client, use_cache=True)
+    assert len(edited_client.spreadsheet.batch_calls()) > 0
+
+
+def test_snapshot_keeps_other_question_sets(tmp_path):
+    by_question = {1: [10, 11], 2: [20], 3: [30, 31, 32]}
+    first = fp.SpreadsheetData("sheet", client=fakes.feedback_client(by_question), snapshot_folder=str(tmp_path))
+    first.prefetch([1, 2, 404])
+    second = fp.SpreadsheetData("sheet", client=fakes.feedback_client(by_question), snapshot_folder=str(tmp_path))
+    second.prefetch([3])
+
+    client = fakes.feedback_client(by_question)
+    warm = fp.SpreadsheetData("sheet", client=client, snapshot_folder=str(tmp_path))
+    warm.prefetch([1, 2, 3, 404])
+    assert client.spreadsheet.calls == []
+    assert warm.feedback(404) is None
+    for question_id, answer_ids in by_question.items():
+        assert warm.feedback(question_id)["AnswerId"].tolist() == answer_ids
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fakes
+import feedback_processing as fp
+
+
+@pytest.fixture
+def meta(tmp_path):
+    frames = fakes.meta_dump(questions=12, seed=5)
+    posts, users = frames["posts"], frames["users"]
+    questions = posts.index[posts["PostTypeId"] == 1]
+    # Users 6..10 are employees (employee_accounts.csv), they ask all but two questions
+    posts.loc[questions, "OwnerUserId"] = [6, 7, 8, 9, 10, 6, 7, 8, 9, 10, 50, 51]
+    # Ties and a question without views
+    posts.loc[questions[[1, 2, 3]], "ViewCount"] = 777
+    posts["ViewCount"] = posts["ViewCount"].astype(float)
+    posts.loc[questions[4], "ViewCount"] = np.nan
+    # The most discussed question is also the most viewed one: a green reach
+    posts.loc[questions[9], "ViewCount"] = 100000
+    posts["AccountId"] = posts["OwnerUserId"].map(users.set_index("Id")["AccountId"])
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+
+    by_question = fakes.answers_by_question(frames)
+    # Questions 9..12 have no feedback sheet
+    client = fakes.feedback_client({id: by_question[id] for id in range(1, 9)})
+    return fp.MetaData(
+        "sheet", "meta", sorted(by_question.keys()), str(tmp_path), use_cache=False,
+        spreadsheet_client=client
+    )
+
+
+def test_grade_table_matches_the_per_question_grades(meta):
+    table = fp.Grader.grade_table(meta)
+    assert table.index.tolist() == list(range(1, 11))
+    assert set(table["ReachGrade"]) == {"green", "yellow", "red"}
+
+    for question_id in table.index:
+        grader = fp.Grader(question_id, None, meta)
+        grade, view_count, interest = grader.reach_grade()
+        assert table.at[question_id, "ReachGrade"] == grade
+        assert table.at[question_id, "ViewCount"] == pytest.approx(view_count)
+        assert table.at[question_id, "Interest"] == pytest.approx(interest)
+
+        if question_id > 8:
+            # feedback_grade divides by a zero total, the table has no grade
+            assert table.at[question_id, "FeedbackGrade"] is None
+            assert np.isnan(table.at[question_id, "Positive"])
+            continue
+        grade, results = grader.feedback_grade()
+        assert table.at[question_id, "FeedbackGrade"] == grade
+        assert table.loc[question_id, ["Positive", "Neutral", "Negative"]].tolist() == pytest.approx(results)
+
+    subset = fp.Grader.grade_table(meta, [3, 11, 1])
+    assert subset.index.tolist() == [3, 11, 1]
+    assert subset.loc[11].isna().all()
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+import fakes
+import feedback_processing as fp
+
+
+def _load(tmp_path, frames, incremental):
+    questions = sorted(fakes.answers_by_question(frames).keys())
+    return fp.MetaData(
+        "sheet", "meta", questions, str(tmp_path), use_cache=incremental, incremental=incremental,
+        spreadsheet_client=fakes.feedback_client(fakes.answers_by_question(frames))
+    )
+
+
+def _next_dump(frames, seed=1):
+    # New votes and comments, scores and views of old posts move, an old vote is deleted
+    rng = np.random.default_rng(seed)
+    frames = {name: df.copy() for name, df in frames.items()}
+    posts = frames["posts"]
+    posts["ViewCount"] = posts["ViewCount"] + rng.integers(0, 300, len(posts.index))
+    posts.loc[posts.index[::3], "Score"] += 5
+    posts.loc[posts.index[4], "DeletionDate"] = "2022-03-01 00:00:00"
+    comments = frames["comments"]
+    comments.loc[comments.index[::5], "Score"] = 3
+
+    for name, parent_field, parents in [
+        ("post_votes", "PostId", posts["Id"].values),
+        ("comments", "PostId", posts["Id"].values),
+        ("comment_votes", "PostCommentId", comments["Id"].values)
+    ]:
+        df = frames[name]
+        extra = df.sample(40, random_state=seed).copy()
+        extra["Id"] = df["Id"].max() + 1 + np.arange(len(extra.index))
+        extra[parent_field] = rng.choice(parents, len(extra.index))
+        extra["CreationDate"] = "2022-04-01 00:00:00"
+        frames[name] = pd.concat([df, extra], ignore_index=True)
+    frames["post_votes"].loc[3, "DeletionDate"] = "2022-04-02 00:00:00"
+    return frames
+
+
+def test_incremental_load_matches_full_load(tmp_path):
+    frames = fakes.meta_dump()
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    _load(tmp_path, frames, incremental=True)
+
+    frames = _next_dump(frames)
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    incremental = _load(tmp_path, frames, incremental=True)
+    full = _load(tmp_path, frames, incremental=False)
+
+    for name in fp.MetaData.DELTA_TABLES + ["users"]:
+        expected = getattr(full, name).sort_values(by="Id").reset_index(drop=True)
+        actual = getattr(incremental, name).sort_values(by="Id").reset_index(drop=True)
+        pd.testing.assert_frame_equal(actual[expected.columns], expected, check_dtype=False)
+    assert incremental.posts["ViewCount"].sum() == frames["posts"]["ViewCount"].sum()
@@ -0,0 +1,23 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import feedback_processing as fp
+
+
+def test_to_json_accepts_numpy_and_timestamps(tmp_path):
+    profiler = fp.StageProfiler()
+    with profiler.stage("load", QuestionId=np.int64(42), Since=pd.Timestamp("2022-01-01")) as stage:
+        with profiler.stage("count") as inner:
+            inner.rows = np.int64(10)
+        stage.rows = np.int32(3)
+
+    trace = json.loads(profiler.to_json(str(tmp_path / "trace.json")))
+    assert json.loads((tmp_path / "trace.json").read_text()) == trace
+    by_path = {record["Path"]: record for record in trace}
+    assert by_path["load"]["QuestionId"] == 42
+    assert by_path["load"]["Since"] == "2022-01-01T00:00:00"
+    assert by_path["load"]["Rows"] == 3
+    assert by_path["load/count"]["Rows"] == 10
+    assert by_path["load/count"]["Depth"] == 1
@@ -0,0 +1,77 @@
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import report
+
+
+@pytest.fixture
+def export_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(report, "EXPORT_FOLDER", str(tmp_path))
+    monkeypatch.setattr(report, "INLINE_EXPORT_LIMIT", 1024)
+    monkeypatch.setattr(report, "EXPORTED_FILES", list())
+    return tmp_path
+
+
+def _frame(rows):
+    return pd.DataFrame({"Id": np.arange(rows), "Name": ["user %d" % (index) for index in range(rows)]})
+
+
+def test_link_text_names_the_format(export_folder):
+    assert "Download CSV file</a>" in report.create_download_link(_frame(3)).data
+    assert "Download gzipped CSV file</a>" in report.create_download_link(_frame(500)).data
+    html = report.create_download_link(_frame(500), fmt="parquet").data
+    assert "Download Parquet file</a>" in html
+    assert report.EXPORTED_FILES[-1].endswith(".parquet")
+    assert "Votes</a>" in report.create_download_link(_frame(500), title="Votes").data
+
+
+def test_colab_downloads_only_on_click(export_folder, monkeypatch):
+    downloaded, callbacks = list(), dict()
+    colab = types.ModuleType("google.colab")
+    colab.files = types.SimpleNamespace(download=downloaded.append)
+    colab.output = types.SimpleNamespace(register_callback=callbacks.__setitem__)
+    google = types.ModuleType("google")
+    google.colab = colab
+    monkeypatch.setitem(sys.modules, "google", google)
+    monkeypatch.setitem(sys.modules, "google.colab", colab)
+    monkeypatch.setattr(report, "DEFINE", "colab")
+
+    html = report.create_download_link(_frame(500)).data
+    assert downloaded == []
+    (name, callback), = callbacks.items()
+    assert "google.colab.kernel.invokeFunction('%s'" % (name) in html
+    assert "Download gzipped CSV file</a>" in html
+
+    callback()
+    assert downloaded == report.EXPORTED_FILES
+
+
+@pytest.mark.parametrize("ascending", [True, False])
+def test_sort_order_puts_missing_values_last(ascending):
+    column = pd.Series(["b", np.nan, "a", "c", None, "a"], dtype=object)
+    order = report.sort_order_(column, ascending)
+    expected = [2, 5, 0, 3] if ascending else [3, 0, 2, 5]
+    assert order.tolist() == expected + [1, 4]
+
+    numbers = pd.Series([3.0, np.nan, 1.0, 2.0])
+    assert report.sort_order_(numbers, ascending).tolist() == ([2, 3, 0, 1] if ascending else [0, 3, 2, 1])
+
+
+def test_parquet_export_keeps_one_schema_across_chunks(tmp_path):
+    df = pd.DataFrame({
+        "Id": np.arange(9),
+        "Theme": ["a", "b", "c"] + [None] * 6,
+        "Count": pd.Series([None] * 3 + [1, 2, 3] + [None] * 3, dtype=object)
+    })
+    path = report.export_frame(df, "sparse", "parquet", folder=str(tmp_path), chunk_rows=3)
+    pd.testing.assert_frame_equal(pd.read_parquet(path), df, check_dtype=False)
+
+
+def test_files_mode_needs_a_folder():
+    with pytest.raises(ValueError):
+        report.set_output("files")
+    assert report.OUTPUT_MODE == "notebook"
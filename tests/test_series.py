@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import fakes
+import feedback_processing as fp
+
+
+@pytest.fixture
+def meta(tmp_path):
+    frames = fakes.meta_dump()
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    by_question = fakes.answers_by_question(frames)
+    return fp.MetaData(
+        "sheet", "meta", sorted(by_question.keys()), str(tmp_path), use_cache=False,
+        spreadsheet_client=fakes.feedback_client(by_question)
+    )
+
+
+def _old_question_users(series, question_id):
+    # The per-question lookups question_user_info made before question_metrics
+    def _values(df, field, key, value):
+        return df[df[key] == value][field].values.tolist()
+
+    content = _values(series.posts, "OwnerUserId", "ParentId", question_id)
+    voters = list()
+    for post_id in [question_id] + series.posts[series.posts["ParentId"] == question_id]["Id"].unique().tolist():
+        content.extend(_values(series.comments, "UserId", "PostId", post_id))
+        voters.extend(_values(series.post_votes, "UserId", "PostId", post_id))
+        for comment_id in series.comments[series.comments["PostId"] == post_id]["Id"].unique():
+            voters.extend(_values(series.comment_votes, "UserId", "PostCommentId", comment_id))
+    return content + voters, content, voters
+
+
+def _old_unique_count(values):
+    # len(set(list)) of the old loop: every NaN in the list is a user of its own
+    values = pd.Series(values, dtype=float)
+    return values.dropna().nunique() + values.isna().sum()
+
+
+def test_question_metrics_count_users_like_the_old_loop(tmp_path):
+    frames = fakes.meta_dump(seed=3)
+    answers = frames["posts"].index[frames["posts"]["PostTypeId"] == 2]
+    frames["posts"].loc[answers[::5], "OwnerUserId"] = np.nan
+    frames["post_votes"]["UserId"] = frames["post_votes"]["UserId"].astype(float)
+    frames["post_votes"].loc[frames["post_votes"].index[::9], "UserId"] = np.nan
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    by_question = fakes.answers_by_question(frames)
+    meta = fp.MetaData(
+        "sheet", "meta", sorted(by_question.keys()), str(tmp_path), use_cache=False,
+        spreadsheet_client=fakes.feedback_client(by_question)
+    )
+    series = fp.SeriesFeedback(meta)
+    metrics = series.question_metrics()
+
+    for question_id in sorted(by_question.keys()):
+        all, content, voters = _old_question_users(series, question_id)
+        assert metrics.at[question_id, "Users"] == _old_unique_count(all)
+        assert metrics.at[question_id, "ContentUsers"] == _old_unique_count(content)
+        assert metrics.at[question_id, "Voters"] == _old_unique_count(voters)
+
+    # participants() still leaves the rows without a user out
+    assert (series.participants()["UserId"] >= -1).all()
+
+
+def _old_new_users(data, order):
+    # The loop new_users ran before first_seen, over order instead of the sorted
+    # series; rows without a user are left out like in participants()
+    question_users = list()
+    for question_id in order:
+        post_ids = data.posts[data.posts["ParentId"] == question_id]["Id"].values.tolist()
+        answer_givers = data.posts[data.posts["Id"].isin(post_ids)]["OwnerUserId"].values.tolist()
+        post_voters = data.post_votes[data.post_votes["PostId"].isin(post_ids + [question_id])]["UserId"].values.tolist()
+        comments = data.comments[data.comments["PostId"].isin(post_ids + [question_id])]
+        commenters = comments["UserId"].values.tolist()
+        comment_voters = data.comment_votes[data.comment_votes["PostCommentId"].isin(comments["Id"])]["UserId"].values.tolist()
+        all_users = [user for user in answer_givers + commenters + post_voters + comment_voters if not pd.isnull(user)]
+        question_users.append((question_id, all_users))
+
+    new_values, total_values = list(), list()
+    all_past_users = set()
+    for (question, users) in question_users:
+        current_users = list(set(users) - all_past_users)
+        all_past_users = set(list(all_past_users) + current_users)
+        new_values.append(len(current_users))
+        total_values.append(len(set(users)))
+    return new_values, total_values
+
+
+@pytest.mark.parametrize("shuffle", [False, True])
+def test_new_user_counts_match_the_old_loop(tmp_path, shuffle):
+    frames = fakes.meta_dump(questions=8, users=120, seed=4)
+    fakes.write_meta_dump(tmp_path / "meta", frames)
+    by_question = fakes.answers_by_question(frames)
+    # 404 is a question of the series without any posts in the dump
+    questions = sorted(by_question.keys()) + [404]
+    meta = fp.MetaData(
+        "sheet", "meta", questions, str(tmp_path), use_cache=False,
+        spreadsheet_client=fakes.feedback_client(by_question)
+    )
+    series = fp.SeriesFeedback(meta)
+    order = list(np.random.default_rng(1).permutation(questions)) if shuffle else None
+
+    counts = series.new_user_counts(order)
+    new_values, total_values = _old_new_users(meta, questions if order is None else order)
+    assert counts.index.tolist() == (questions if order is None else order)
+    assert counts["New"].tolist() == new_values
+    assert counts["Total"].tolist() == total_values
+    assert counts.loc[404].tolist() == [0, 0, 0]
+    assert (counts["Returning"] == counts["Total"] - counts["New"]).all()
+    assert sum(new_values) == len(series.first_seen(order).index)
@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils
+
+
+def _reference_moving_avarage(df, date_field, group_field, period=29, day_threshold=1):
+    # The per-day loop date_moving_avarage used before the sliding window
+    end_dates = df[date_field].dt.round("D").unique()
+    dates = pd.DataFrame(data={
+        "StartDate": end_dates - pd.to_timedelta(period, unit='d'),
+        "EndDate": end_dates + pd.to_timedelta(1, unit='d'),
+        "Index": end_dates
+    })
+    dates = dates.sort_values(by=["EndDate"])
+    result_idx = list()
+    result_values = list()
+    for index, row in dates.iterrows():
+        tmp = df[(df[date_field] > row.StartDate) & (df[date_field] <= row.EndDate)]
+        tmp = tmp.groupby(by=[group_field])[date_field].count().rename("Number").to_frame()
+        tmp = tmp[tmp["Number"] >= day_threshold]
+        result_idx.append(row.Index)
+        result_values.append(len(tmp.index))
+    return pd.DataFrame(data={"OnDate": result_idx, "Value": result_values})
+
+
+def _activity(rows=3000, users=150, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "CreationDate": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 200 * 86400, rows), unit="s"),
+        "UserId": rng.integers(1, users, rows).astype(float)
+    })
+    df.loc[rng.random(rows) < 0.03, "CreationDate"] = pd.NaT
+    df.loc[rng.random(rows) < 0.03, "UserId"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+@pytest.mark.parametrize("period,day_threshold", [(29, 1), (6, 2), (0, 1), (13, 0), (29, 5)])
+def test_date_moving_avarage_matches_reference(seed, period, day_threshold):
+    df = _activity(seed=seed)
+    expected = _reference_moving_avarage(df, "CreationDate", "UserId", period, day_threshold)
+    actual = utils.date_moving_avarage(df, "CreationDate", "UserId", period, day_threshold)
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_date_moving_avarage_without_groups():
+    df = _activity(rows=50)
+    df["UserId"] = np.nan
+    expected = _reference_moving_avarage(df, "CreationDate", "UserId")
+    actual = utils.date_moving_avarage(df, "CreationDate", "UserId")
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_buckets_expose_their_rows_like_dicts():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "CreationUserId": rng.integers(0, 60, 2000),
+        "PostId": np.arange(2000),
+        "CreationDate": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 90, 2000), unit="D")
+    })
+    buckets = utils.split_into_buckets(df, need_report=False)
+    bucket = buckets[0]
+    assert "bucket" in bucket
+    assert "bucket" in bucket.keys()
+    assert {"low", "hight", "total"} <= set(bucket.keys())
+    rows = bucket.get("bucket")
+    assert rows is bucket["bucket"]
+    assert bucket.get("missing") is None
+    assert rows["CreationUserId"].nunique() == bucket["total"]
+    assert sum(len(b["bucket"].index) for b in buckets) == len(df.index)
+    assert dict(bucket)["bucket"] is rows
+
+
+def _bucket_activity(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "CreationUserId": (rng.pareto(1.2, rows) * 5).astype(int).astype(float),
+        "PostId": rng.integers(0, rows // 2, rows),
+        "CreationDate": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 90 * 86400, rows), unit="s")
+    })
+    df.loc[rng.random(rows) < 0.02, "CreationDate"] = pd.NaT
+    df.loc[rng.random(rows) < 0.02, "CreationUserId"] = np.nan
+    return df
+
+
+def _plain(buckets):
+    # The dicts split_into_buckets returned before, display_buckets groups them one by one
+    return [{key: bucket[key] for key in ["bucket", "low", "hight", "total"]} for bucket in buckets]
+
+
+def _assert_same_series(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        pd.testing.assert_series_equal(a, e, check_dtype=False, check_freq=False, check_index_type=False)
+
+
+@pytest.mark.parametrize("freq", ["D", "W"])
+@pytest.mark.parametrize("unique", [False, True])
+def test_display_buckets_matches_per_bucket_grouping(freq, unique):
+    buckets = utils.split_into_buckets(_bucket_activity(), need_report=False)
+    expected = utils.display_buckets(_plain(buckets), freq, "CreationDate", unique=unique, long_name=True)
+    actual = utils.display_buckets(buckets, freq, "CreationDate", unique=unique, long_name=True)
+    _assert_same_series(actual, expected)
+
+
+def test_display_buckets_follows_replaced_rows():
+    buckets = utils.split_into_buckets(_bucket_activity(), need_report=False)
+    rows = buckets[1]["bucket"]
+    buckets[1]["bucket"] = rows.iloc[:len(rows.index) // 2]
+    actual = utils.display_buckets(buckets, "W", "CreationDate")
+    assert actual[1].sum() == buckets[1]["bucket"]["CreationDate"].notna().sum()
+    _assert_same_series(actual, utils.display_buckets(_plain(buckets), "W", "CreationDate"))
+
+
+def _cohorts(rows=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Cohort": rng.integers(0, 6, rows),
+        "Year": rng.choice([2020, 2021], rows),
+        "IsSuccessful": rng.random(rows) < 0.4,
+        "Outcome": (rng.random(rows) < 0.55).astype(int)
+    })
+    df.loc[df["Cohort"] == 5, "Outcome"] = rng.choice([0, 1, 2], (df["Cohort"] == 5).sum())
+    return df
+
+
+@pytest.mark.parametrize("cohort_field", ["Cohort", ["Cohort", "Year"]])
+def test_further_participation_batch_matches_per_cohort_test(cohort_field):
+    df = _cohorts()
+    fields = cohort_field if isinstance(cohort_field, list) else [cohort_field]
+    result = utils.test_further_participation_batch(df, cohort_field)
+    assert len(result.index) == len(df.groupby(fields))
+    for row in result.itertuples():
+        cohort = df[(df[fields] == [getattr(row, field) for field in fields]).all(axis=1)]
+        (statistic, pvalue), crosstbl, expectedtbl = utils.test_further_participation(
+            cohort[cohort["IsSuccessful"]], cohort[~cohort["IsSuccessful"]]
+        )
+        assert row.Statistic == pytest.approx(statistic)
+        assert row.PValue == pytest.approx(pvalue)
+        assert row.SuccessfulContinued == crosstbl.at["Continued", "SuccessfulPost"]
+        assert row.UnsuccessfulLeft == crosstbl.at["Left", "UnsuccessfulPost"]
+        assert row.ExpectedSuccessfulLeft == pytest.approx(expectedtbl.at["Left", "SuccessfulPost"])
+        assert row.Total == len(cohort.index)
+
+
+def test_further_participation_batch_cohort_of_successes_only():
+    df = _cohorts()
+    df.loc[df["Cohort"] == 0, "IsSuccessful"] = True
+    result = utils.test_further_participation_batch(df, "Cohort").set_index("Cohort")
+    assert np.isnan(result.at[0, "Statistic"])
+    assert np.isnan(result.at[0, "PValue"])
+    assert result.drop(index=0)["Statistic"].notna().all()
+
+
+def _posts_by_date(rows=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "PostId": np.arange(rows),
+        "PostTypeId": rng.choice([1, 2, np.nan], rows, p=[0.3, 0.65, 0.05]),
+        "CreationDate": pd.Timestamp("2019-06-01") + pd.to_timedelta(rng.integers(0, 900 * 86400, rows), unit="s")
+    })
+    df.loc[rng.random(rows) < 0.03, "CreationDate"] = pd.NaT
+    return df
+
+
+@pytest.mark.parametrize("by", ["year", "quarter", "month", "PostTypeId"])
+def test_partition_by_matches_per_key_masks(by):
+    df = _posts_by_date()
+    keys = {
+        "year": lambda: df["CreationDate"].dt.year,
+        "quarter": lambda: df["CreationDate"].dt.to_period("Q"),
+        "month": lambda: df["CreationDate"].dt.to_period("M"),
+        "PostTypeId": lambda: df["PostTypeId"]
+    }[by]()
+    # The old split_by_year: one mask per unique key
+    expected = {key: df[keys == key] for key in keys.unique() if not pd.isnull(key)}
+
+    partitions = utils.partition_by(df, by)
+    assert set(partitions.keys()) == set(expected.keys())
+    for key, rows in expected.items():
+        pd.testing.assert_frame_equal(partitions[key], rows)
+    assert sum(len(rows.index) for rows in partitions.values()) == keys.notna().sum()
+
+
+def test_split_by_year_is_a_read_only_mapping():
+    df = _posts_by_date()
+    years = utils.split_by_year(df)
+    assert sorted(years) == sorted(df["CreationDate"].dt.year.dropna().unique())
+    with pytest.raises(TypeError):
+        years[1999] = df
+    copy = dict(years)
+    copy.pop(2019)
+    assert 2019 in years
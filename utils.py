@@ -1,19 +1,26 @@
 import os
 import re
+from collections.abc import Mapping, MutableMapping
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from matplotlib import pyplot as plt
 import numpy as np
 import pandas as pd
 
 
-from scipy.stats import chisquare
+def read_csvs_in_folder(source_folder, dtype=None, usecols=None, parse_dates=None, engine=None, max_workers=None):
+    # dtype / usecols / parse_dates go straight to pd.read_csv, so the frame comes
+    # back already typed. engine="pyarrow" switches to the Arrow CSV reader.
+    files = sorted([os.path.join(source_folder, f) for f in os.listdir(source_folder) if re.match(r'.*\.csv$', f)])
+
+    def _read(file_):
+        return pd.read_csv(file_, dtype=dtype, usecols=usecols, parse_dates=parse_dates, engine=engine)
 
-def read_csvs_in_folder(source_folder):
-    files = [os.path.join(source_folder, f)  for f in os.listdir(source_folder) if re.match(r'.*.csv', f)] 
     if len(files) == 1:
-        return pd.read_csv(files[0])
-    dfs = [pd.read_csv(file_) for file_ in files]
-    return pd.concat(dfs)     
+        return _read(files[0])
+    # pandas releases the GIL while parsing, so a thread pool is enough here
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        dfs = list(executor.map(_read, files))
+    return pd.concat(dfs)
 
 def np_dt_to_timedelta(dt64):
     # https://stackoverflow.com/a/13704307/564240
@@ -28,80 +35,215 @@ def date_moving_avarage(df, date_field, group_field, period=29, day_threshold=1)
         "Index": end_dates
     })
     dates = dates.sort_values(by=["EndDate"])
-    result_idx = list()
-    result_values = list()
-    for index, row in dates.iterrows():
-        sd = row.StartDate
-        ed = row.EndDate
-        i = row.Index
 
-        tmp = df[(df[date_field] > sd) & (df[date_field] <= ed)]
-        tmp = tmp.groupby(by=[group_field])[date_field].count().rename("Number").to_frame()
-        tmp = tmp[tmp["Number"] >= day_threshold]
-        result_idx.append(i)
-        result_values.append(len(tmp.index))
+    # Sliding window over the rows sorted by date: (StartDate; EndDate] only moves
+    # forward, so every row enters and leaves the window exactly once and we keep
+    # per-group counts and the number of groups above the threshold incrementally.
+    tmp = df[df[date_field].notna()]
+    codes, _ = pd.factorize(tmp[group_field])
+    row_dates = pd.DatetimeIndex(tmp[date_field]).asi8[codes >= 0]
+    codes = codes[codes >= 0]
+    order = np.argsort(row_dates, kind="stable")
+    row_dates = row_dates[order]
+    codes = codes[order]
+
+    counts = np.zeros(codes.max() + 1 if len(codes) > 0 else 0, dtype=np.int64)
+    threshold = max(day_threshold, 1)
+    starts = np.searchsorted(row_dates, pd.DatetimeIndex(dates["StartDate"]).asi8, side="right")
+    ends = np.searchsorted(row_dates, pd.DatetimeIndex(dates["EndDate"]).asi8, side="right")
+    valid = dates["EndDate"].notna().values
+
+    def _move(window_codes, sign):
+        keys, number = np.unique(window_codes, return_counts=True)
+        before = counts[keys]
+        after = before + sign * number
+        counts[keys] = after
+        return np.count_nonzero(after >= threshold) - np.count_nonzero(before >= threshold)
+
+    result_values = list()
+    active = 0
+    low = high = 0
+    for sd, ed, is_valid in zip(starts, ends, valid):
+        if not is_valid:
+            result_values.append(0)
+            continue
+        if ed > high:
+            active += _move(codes[high:ed], 1)
+            high = ed
+        if sd > low:
+            active += _move(codes[low:sd], -1)
+            low = sd
+        result_values.append(active)
 
     return pd.DataFrame(data={
-        "OnDate": result_idx,
+        "OnDate": dates["Index"].reset_index(drop=True),
         "Value": result_values
-    })     
+    })
 
 def display_buckets(buckets, freq, group_field='CrationDate', count_field='PostId', long_name=False, unique=False):
+    def _name(index, bucket):
+        return "Bucket %d, [%d; %d], total %d" % (
+            index, bucket['low'], bucket['hight'], bucket['total']
+        ) if long_name else "Bucket_%d" % (index)
+
+    if len(buckets) > 0 and all("labels" in bucket and bucket["labels"] is buckets[0]["labels"] for bucket in buckets):
+        # Buckets from split_into_buckets share one labeled frame: the dates are
+        # binned once (on their unique values) and one groupby over (label, bin)
+        # gives the series of all buckets. A bucket whose rows were replaced
+        # has no labels any more, then every bucket is grouped on its own.
+        df, labels = buckets[0]["frame"], buckets[0]["labels"]
+        date_codes, dates = pd.factorize(df[group_field])
+        by_date = pd.DataFrame({group_field: dates}).groupby(pd.Grouper(key=group_field, freq=freq))
+        periods = by_date.size().index
+        period_codes = by_date.ngroup().reindex(range(len(dates))).values[date_codes]
+        dated = date_codes >= 0
+
+        tmp = df[count_field][dated].groupby([labels[dated], period_codes[dated]])
+        tmp = tmp.nunique() if unique else tmp.count()
+        data = []
+        for index, bucket in enumerate(buckets):
+            if bucket["label"] in tmp.index.levels[0]:
+                series = tmp.xs(bucket["label"], level=0)
+                codes = np.arange(series.index.min(), series.index.max() + 1)
+                series = pd.Series(series.reindex(codes, fill_value=0).values, index=periods[codes])
+            else:
+                series = pd.Series(dtype=tmp.dtype, index=periods[:0])
+            data.append(series.rename(_name(index, bucket)))
+        return data
+
     data = []
     for index, bucket in enumerate(buckets):
         tmp = bucket['bucket'].groupby(pd.Grouper(key=group_field, freq=freq))
         tmp = tmp[count_field].nunique() if unique else tmp[count_field].count()
-        tmp = tmp.rename(
-            "Bucket %d, [%d; %d], total %d" % (
-                index, bucket['low'], bucket['hight'], bucket['total']
-            ) if long_name else "Bucket_%d" % (index)
-        )
+        tmp = tmp.rename(_name(index, bucket))
         data.append(tmp)
     return data
-    
-def split_into_buckets(df, groupby_field='CreationUserId', count_field='PostId', iterations=3, need_report=True):
-    def add_bucket(buckets, sliced, low, hight, index, need_report):
-        total = sliced.groupby([groupby_field])[count_field].count().size
-        if need_report:
-            print("Bucket %f [%d; %d], size %d" % (index, low, hight, total))
-
-        buckets.append({
-            "bucket": sliced,
-            "low": low,
-            "hight": hight,
-            "total": total
-        })
-        
+
+class _Bucket(MutableMapping):
+    # A bucket dict whose rows are only sliced out of the frame when "bucket"
+    # is read; "bucket" is a key for get / in / keys like it was before
+    def __init__(self, fields, **kwargs):
+        self._fields = dict(fields, **kwargs)
+
+    def __getitem__(self, key):
+        if key == "bucket" and key not in self._fields:
+            self._fields[key] = self._fields["frame"][self._fields["mask"]]
+        return self._fields[key]
+
+    def __setitem__(self, key, value):
+        if key == "bucket":
+            # The labels no longer describe the rows of this bucket
+            self._fields.pop("labels", None)
+        self._fields[key] = value
+
+    def __delitem__(self, key):
+        del self._fields[key]
+
+    def __iter__(self):
+        yield from self._fields
+        if "bucket" not in self._fields:
+            yield "bucket"
+
+    def __len__(self):
+        return len(self._fields) + (0 if "bucket" in self._fields else 1)
+
+    def __contains__(self, key):
+        return key == "bucket" or key in self._fields
+
+def label_buckets(df, groupby_field='CreationUserId', count_field='PostId', iterations=3, need_report=True):
+    # return: a bucket label per row (-1 for rows that fell into no bucket) and
+    #         the list of buckets with their label, low/hight thresholds and number of users
+    counts = df.groupby([groupby_field])[count_field].count()
     if need_report:
-        print("Total size %s" % (str(df.groupby([groupby_field])[count_field].count().size)))
-        
+        print("Total size %s" % (str(counts.size)))
+
+    user_labels = pd.Series(-1, index=counts.index)
     buckets = []
+    remaining = counts
     threshold_low = 0
     for index in range(iterations):
-        tmp_df = df.groupby([groupby_field])[count_field].count()
-        if len(tmp_df.index) == 0:
-            return buckets        
+        if len(remaining.index) == 0:
+            break
 
-        q75 = tmp_df.quantile(0.75)
-        q25 = tmp_df.quantile(0.25)
+        q75 = remaining.quantile(0.75)
+        q25 = remaining.quantile(0.25)
         iqr = q75 - q25
         threshold_hight = int(round(q75 + 1.5 * iqr))
-        tmp_df = tmp_df[(tmp_df >= threshold_low) & (tmp_df <= threshold_hight)]
-        
-        the_slice = df[df[groupby_field].isin(set(tmp_df.index))]
-        the_rest = df[~df[groupby_field].isin(set(tmp_df.index))]
-        add_bucket(buckets, the_slice, threshold_low, threshold_hight, index, need_report)
+        in_bucket = (remaining >= threshold_low) & (remaining <= threshold_hight)
+        user_labels[remaining.index[in_bucket.values]] = index
+        buckets.append({"label": index, "low": threshold_low, "hight": threshold_hight, "total": int(in_bucket.sum())})
+        remaining = remaining[~in_bucket.values]
         threshold_low = threshold_hight + 1
-        df = the_rest
         if index+1 == iterations: # the last iteration
-            add_bucket(buckets, the_rest, threshold_low, -1, index+1, need_report)
-        
-    return buckets
+            user_labels[remaining.index] = index + 1
+            buckets.append({"label": index + 1, "low": threshold_low, "hight": -1, "total": len(remaining.index)})
+
+    labels = df[groupby_field].map(user_labels).values
+    if len(buckets) > 0 and buckets[-1]["hight"] == -1:
+        # Rows without a user are never counted, but they always stayed in the rest
+        labels = np.where(pd.isnull(labels), buckets[-1]["label"], labels)
+    labels = np.nan_to_num(labels.astype(float), nan=-1).astype(int)
+
+    if need_report:
+        for bucket in buckets:
+            print("Bucket %f [%d; %d], size %d" % (bucket["label"], bucket["low"], bucket["hight"], bucket["total"]))
+    return labels, buckets
+
+def split_into_buckets(df, groupby_field='CreationUserId', count_field='PostId', iterations=3, need_report=True):
+    labels, buckets = label_buckets(df, groupby_field, count_field, iterations, need_report)
+    return [
+        _Bucket(bucket, mask=(labels == bucket["label"]), frame=df, labels=labels)
+        for bucket in buckets
+    ]
+
+class Partitions(Mapping):
+    # Read-only {key: rows of df} built with one factorize + argsort pass.
+    # A partition is taken out of df only when it is accessed and then kept.
+    def __init__(self, df, keys):
+        self.df = df
+        codes, uniques = pd.factorize(keys)
+        self._order = np.argsort(codes, kind="stable")
+        self._bounds = np.searchsorted(codes[self._order], np.arange(len(uniques) + 1))
+        self._keys = {key: index for index, key in enumerate(uniques)}
+        self._cache = dict()
+
+    def positions(self, key):
+        index = self._keys[key]
+        return self._order[self._bounds[index]:self._bounds[index + 1]]
+
+    def __getitem__(self, key):
+        if key not in self._cache:
+            self._cache[key] = self.df.iloc[self.positions(key)]
+        return self._cache[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+def partition_by(df, by, date_field='CreationDate'):
+    # by: "year", "quarter" or "month" of date_field, or the name of any column.
+    # return: a read-only Partitions mapping, not a dict: dict(...) of it gives a
+    #         mutable copy. Rows with a missing key (NaT date, NaN value) are in
+    #         no partition; the old per-key masks gave them an empty frame under NaN.
+    if by == "year":
+        keys = df[date_field].dt.year
+    elif by == "quarter":
+        keys = df[date_field].dt.to_period("Q")
+    elif by == "month":
+        keys = df[date_field].dt.to_period("M")
+    else:
+        keys = df[by]
+    return Partitions(df, keys)
 
 def split_by_year(df, date_field='CreationDate'):
-    return {y: df[df[date_field].dt.year == y] for y in df[date_field].dt.year.unique()}        
+    # {year: rows} as a read-only mapping, see partition_by
+    return partition_by(df, "year", date_field)
 
 def test_further_participation(success, unsuccess, test_field="Outcome", test_val_yes=1):
+    from scipy.stats import chisquare
+
     s_yes, s_no = len(success[success[test_field] == test_val_yes].index), len(success[success[test_field] != test_val_yes].index)
     u_yes, u_no = len(unsuccess[unsuccess[test_field] == test_val_yes].index), len(unsuccess[unsuccess[test_field] != test_val_yes].index)
 
@@ -132,3 +274,49 @@ def test_further_participation(success, unsuccess, test_field="Outcome", test_va
     f_exp = [exp_s_yes, exp_u_yes, exp_s_no,  exp_u_no] 
 
     return chisquare(f_obs, f_exp=f_exp, ddof=1), crosstbl, expectedtbl
+
+def test_further_participation_batch(df, cohort_field, success_field="IsSuccessful", test_field="Outcome", test_val_yes=1):
+    # The test of test_further_participation for every cohort at once.
+    # df has one row per user/post with the cohort (a column or a list of columns),
+    # the success flag and the outcome. The result has one row per cohort.
+    from scipy.stats import chi2
+
+    cohort_fields = cohort_field if isinstance(cohort_field, list) else [cohort_field]
+    keys = [df[field] for field in cohort_fields] + [
+        df[success_field].astype(bool).rename("Successful"),
+        (df[test_field] == test_val_yes).rename("Continued")
+    ]
+    counts = df.groupby(keys).size().unstack(["Successful", "Continued"], fill_value=0)
+    counts = counts.reindex(
+        columns=pd.MultiIndex.from_product([[True, False], [True, False]], names=["Successful", "Continued"]),
+        fill_value=0
+    )
+
+    result = pd.DataFrame(index=counts.index)
+    result["SuccessfulContinued"] = counts[(True, True)]
+    result["SuccessfulLeft"] = counts[(True, False)]
+    result["UnsuccessfulContinued"] = counts[(False, True)]
+    result["UnsuccessfulLeft"] = counts[(False, False)]
+
+    observed = result.values.astype(float)
+    total = observed.sum(axis=1)
+    t_succ = observed[:, 0] + observed[:, 1]
+    t_uns = observed[:, 2] + observed[:, 3]
+    t_yes = observed[:, 0] + observed[:, 2]
+    t_no = observed[:, 1] + observed[:, 3]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        expected = np.column_stack([
+            t_succ * t_yes / total,
+            t_succ * t_no / total,
+            t_uns * t_yes / total,
+            t_uns * t_no / total
+        ])
+        statistic = ((observed - expected) ** 2 / expected).sum(axis=1)
+
+    for index, column in enumerate(["SuccessfulContinued", "SuccessfulLeft", "UnsuccessfulContinued", "UnsuccessfulLeft"]):
+        result["Expected" + column] = expected[:, index]
+    result["Total"] = total.astype(int)
+    result["Statistic"] = statistic
+    # the same degrees of freedom as chisquare(f_obs, f_exp, ddof=1) over the 4 cells
+    result["PValue"] = chi2.sf(statistic, 4 - 1 - 1)
+    return result.reset_index()